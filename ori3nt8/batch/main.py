@@ -0,0 +1,70 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import sys
+
+from PySide2.QtCore import QCoreApplication
+
+from ori3nt8.batch.pipeline import BatchConfig, BatchOrientationPipeline
+from ori3nt8.common.containers import build_container
+from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.batching import BatchingExecutor, BatchingConfig, BACKEND_EXECUTOR_BEAN_NAME
+from ori3nt8.gui.inference.cache import PredictionCache
+from ori3nt8.gui.inference.executors import AbstractExecutor, InferenceConfig, OnnxRuntimeConfig, get_executor_type
+from ori3nt8.gui.inference.prediction import OrientationPredictor, TestTimeAugmentationConfig, get_predictor_type
+from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage, MetadataConfig, get_metadata_storage_type
+from ori3nt8.gui.metadata.write_behind import WriteBehindMetadataStorage, WriteBehindConfig, BACKING_STORAGE_BEAN_NAME
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    container = build_container(
+        [
+            BatchConfig,
+            InferenceConfig,
+            OnnxRuntimeConfig,
+            TestTimeAugmentationConfig,
+            BatchingConfig,
+            PreprocessingConfig,
+            MetadataConfig,
+            WriteBehindConfig
+        ]
+    )
+
+    executor_type = get_executor_type(container.resolve[InferenceConfig.executor]())
+    container.register_type[AbstractExecutor, executor_type](bean_name=BACKEND_EXECUTOR_BEAN_NAME)
+    container.register_type[AbstractExecutor, BatchingExecutor]()
+    storage_type = get_metadata_storage_type(container.resolve[MetadataConfig.storage]())
+    container.register_type[AbstractMetadataStorage, storage_type](bean_name=BACKING_STORAGE_BEAN_NAME)
+    container.register_type[AbstractMetadataStorage, WriteBehindMetadataStorage]()
+    container.register_type[PreprocessingPipeline]()
+    container.register_type[PredictionCache]()
+    predictor_type = get_predictor_type(
+        container.resolve[InferenceConfig.graph](),
+        container.resolve[TestTimeAugmentationConfig.mode]()
+    )
+    container.register_type[OrientationPredictor, predictor_type]()
+
+    # Qt's image format plugins are located through the application instance, but no display is required.
+    app = QCoreApplication(sys.argv[:1])
+
+    pipeline = container.inject(BatchOrientationPipeline)()
+    statistics = pipeline.run()
+    sys.exit(1 if statistics.failed > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import dataclasses
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.gui.inference.cache import PredictionCache
+from ori3nt8.gui.inference.prediction import OrientationPredictor, TestTimeAugmentationConfig, TTA_ADAPTIVE
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage, Metadata
+from ori3nt8.utils.jpeg import iter_jpeg_files
+from ori3nt8.utils.metadata import load_exif_data, replace_exif_orientation
+
+logger = logging.getLogger(__name__)
+
+MODE_REPORT = "report"
+MODE_APPLY = "apply"
+
+
+@configuration(["batch"])
+class BatchConfig():
+    path: Path = Configurable[Path](
+        ["path"],
+        description="Path to the directory containing the photos that should be oriented"
+    )
+    mode: str = Configurable[str](
+        ["mode"],
+        default=MODE_REPORT,
+        description=f"Set to \"{MODE_APPLY}\" to write the suggested orientations into the EXIF metadata, or to "
+                    f"\"{MODE_REPORT}\" to only record the suggestions"
+    )
+    decode_workers: int = Configurable[int](
+        ["decode_workers"],
+        default=0,
+        description="Number of threads decoding and preprocessing images, 0 to use one thread per CPU core"
+    )
+    inference_workers: int = Configurable[int](
+        ["inference_workers"],
+        default=16,
+        description="Number of threads submitting images to the executor, whose requests are merged into batches"
+    )
+    queue_size: int = Configurable[int](
+        ["queue_size"],
+        default=64,
+        description="Maximum number of images waiting between two pipeline stages"
+    )
+    report_interval: float = Configurable[float](
+        ["report_interval"],
+        default=5.0,
+        description="Number of seconds between progress reports"
+    )
+
+
+@dataclass
+class _PipelineItem:
+    path: Path
+    orientation: int
+    flip: int
+    batch: Optional[np.ndarray] = None
+    probabilities: Optional[np.ndarray] = None
+    suggested_orientation: Optional[int] = None
+
+
+class _PipelineStatistics():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.rotated = 0
+        self.failed = 0
+
+    def increment(self, processed: int = 0, rotated: int = 0, failed: int = 0):
+        with self._lock:
+            self.processed += processed
+            self.rotated += rotated
+            self.failed += failed
+
+
+# Marks the end of the stream in the queues between pipeline stages.
+_END_OF_STREAM = object()
+
+
+class BatchOrientationPipeline():
+    def __init__(
+            self,
+            batch_config: Annotated[BatchConfig, Inject],
+            orientation_predictor: Annotated[OrientationPredictor, Inject],
+            prediction_cache: Annotated[PredictionCache, Inject],
+            metadata_storage_engine: Annotated[AbstractMetadataStorage, Inject],
+            tta_config: Annotated[TestTimeAugmentationConfig, Inject]
+    ):
+        """
+        Orients every JPEG file in a directory tree without the GUI.
+
+        The work is split into three stages that are connected by bounded queues: decoding and preprocessing,
+        inference and writing the results. The bounded queues keep the memory usage constant regardless of the size
+        of the library, while letting the decoding threads run ahead of the network. The inference stage runs several
+        threads so that the executor can merge their requests into larger batches. Images that have already been
+        analysed by the current model are neither decoded nor passed to the network.
+
+        Parameters
+        ----------
+        batch_config
+            The configuration of the pipeline.
+        orientation_predictor
+            The predictor that will be used to suggest orientations.
+        prediction_cache
+            The cache of the orientation probabilities of previously analysed images.
+        metadata_storage_engine
+            The storage that will receive the suggestions, so that the GUI can pick them up later.
+        tta_config
+            The test time augmentation configuration. In the adaptive mode, the reports include the fraction of the
+            predictions that needed all four rotations.
+        """
+        if batch_config.mode not in (MODE_REPORT, MODE_APPLY):
+            raise ValueError(f"Unknown batch mode: {batch_config.mode}")
+        self.root = batch_config.path.absolute()
+        self.apply_suggestions = batch_config.mode == MODE_APPLY
+        self.decode_workers = batch_config.decode_workers or os.cpu_count() or 1
+        self.inference_workers = max(batch_config.inference_workers, 1)
+        self.report_interval = batch_config.report_interval
+        self.orientation_predictor: OrientationPredictor = orientation_predictor
+        self.prediction_cache: PredictionCache = prediction_cache
+        self.metadata_storage_engine: AbstractMetadataStorage = metadata_storage_engine
+        self.report_tta_statistics = tta_config.mode == TTA_ADAPTIVE
+
+        self._paths = queue.Queue(maxsize=batch_config.queue_size)
+        self._decoded = queue.Queue(maxsize=batch_config.queue_size)
+        self._predicted = queue.Queue(maxsize=batch_config.queue_size)
+        self.statistics = _PipelineStatistics()
+
+    def run(self) -> _PipelineStatistics:
+        start_time = time.monotonic()
+        self._start_stage(self._discover, "discover", 1, self._paths, self.decode_workers)
+        self._start_stage(self._decode, "decode", self.decode_workers, self._decoded, self.inference_workers)
+        self._start_stage(self._infer, "infer", self.inference_workers, self._predicted, 1)
+        writer, = self._start_stage(self._write, "write", 1)
+        while writer.is_alive():
+            writer.join(timeout=self.report_interval)
+            self._report(start_time)
+        self.metadata_storage_engine.flush()
+        return self.statistics
+
+    def _start_stage(
+            self,
+            target: Callable[[], None],
+            name: str,
+            thread_count: int,
+            output: Optional[queue.Queue] = None,
+            consumer_count: int = 0
+    ) -> List[threading.Thread]:
+        """
+        Starts the threads of a pipeline stage. Once all of them finish, every consumer thread of the next stage
+        receives an end of stream marker.
+        """
+        threads = [
+            threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+            for i in range(thread_count)
+        ]
+        for thread in threads:
+            thread.start()
+
+        def close_stage():
+            for thread in threads:
+                thread.join()
+            for _ in range(consumer_count):
+                output.put(_END_OF_STREAM)
+
+        if output is not None:
+            threading.Thread(target=close_stage, name=f"{name}-close", daemon=True).start()
+        return threads
+
+    def _report(self, start_time: float):
+        elapsed = time.monotonic() - start_time
+        statistics = self.statistics
+        images_per_second = statistics.processed / elapsed if elapsed > 0 else 0.0
+        message = (
+            f"Processed {statistics.processed} images ({images_per_second:.1f} images/s), "
+            f"rotated {statistics.rotated}, failed {statistics.failed}"
+        )
+        if self.report_tta_statistics:
+            tta_statistics = self.orientation_predictor.tta_statistics
+            message += (
+                f", {tta_statistics.full_predictions} of {tta_statistics.predictions} predictions "
+                f"({tta_statistics.full_fraction:.1%}) needed all four rotations"
+            )
+        logger.info(message)
+
+    def _discover(self):
+        for path in iter_jpeg_files(self.root):
+            self._paths.put(path)
+
+    def _decode(self):
+        while True:
+            path = self._paths.get()
+            if path is _END_OF_STREAM:
+                return
+            try:
+                self._decoded.put(self._decode_item(path))
+            except Exception:
+                logger.exception(f"Couldn't decode {path}")
+                self.statistics.increment(failed=1)
+
+    def _decode_item(self, path: Path) -> _PipelineItem:
+        orientation, flip = load_exif_data(path)
+        probabilities = self.prediction_cache.load(path)
+        if probabilities is not None:
+            return _PipelineItem(
+                path=path,
+                orientation=orientation,
+                flip=flip,
+                probabilities=probabilities
+            )
+        image = self.orientation_predictor.preprocessing_pipeline.read_image(path)
+        if image.isNull():
+            raise Exception(f"Couldn't read {path}")
+        return _PipelineItem(
+            path=path,
+            orientation=orientation,
+            flip=flip,
+            batch=self.orientation_predictor.prepare(image)
+        )
+
+    def _infer(self):
+        while True:
+            item = self._decoded.get()
+            if item is _END_OF_STREAM:
+                return
+            try:
+                if item.probabilities is None:
+                    item.probabilities = self.orientation_predictor.infer(item.batch)
+                    item.batch = None
+                    self.prediction_cache.dump(item.path, item.probabilities)
+                item.suggested_orientation = int(np.argmax(item.probabilities, axis=-1))
+                self._predicted.put(item)
+            except Exception:
+                logger.exception(f"Couldn't analyse {item.path}")
+                self.statistics.increment(failed=1)
+
+    def _write(self):
+        while True:
+            item = self._predicted.get()
+            if item is _END_OF_STREAM:
+                return
+            try:
+                rotated = self._write_item(item)
+                self.statistics.increment(processed=1, rotated=int(rotated))
+            except Exception:
+                logger.exception(f"Couldn't write the orientation of {item.path}")
+                self.statistics.increment(failed=1)
+
+    def _write_item(self, item: _PipelineItem) -> bool:
+        metadata = self.metadata_storage_engine.load(item.path)
+        if metadata is None:
+            metadata = Metadata(original_orientation=item.orientation)
+        # The loaded metadata may be shared with the write-behind queue, so it is copied rather than modified
+        metadata = dataclasses.replace(metadata, suggested_orientation=item.suggested_orientation)
+
+        # Never override an orientation that has been chosen by the user.
+        rotate = self.apply_suggestions \
+                 and not metadata.orientation_was_selected_manually \
+                 and item.suggested_orientation != item.orientation
+        if rotate:
+            replace_exif_orientation(item.path, orientation=item.suggested_orientation, flip=item.flip)
+            metadata.orientation_was_selected_automatically = True
+        self.metadata_storage_engine.dump(item.path, metadata)
+        return rotate
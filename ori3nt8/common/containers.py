@@ -26,7 +26,7 @@ from grundzeug.container.plugins import ContainerConverterResolutionPlugin, Cont
 from grundzeug.converters import Converter
 
 
-def build_container(config_classes):
+def build_container(config_classes, ignore_unknown_arguments: bool = False):
     container = Container()
     container.add_plugin(ContainerConverterResolutionPlugin())
     container.register_instance[Converter[list, Tuple[float, float, float]]](tuple)
@@ -43,7 +43,11 @@ def build_container(config_classes):
         required=False
     )
     arg_parse_provider.register_arguments(arg_parser)
-    args = arg_parser.parse_args(sys.argv[1:])
+    if ignore_unknown_arguments:
+        # Leave the arguments meant for other parsers (e.g. Qt's) alone
+        args, _ = arg_parser.parse_known_args(sys.argv[1:])
+    else:
+        args = arg_parser.parse_args(sys.argv[1:])
     arg_parse_provider.process_parsed_arguments(args)
     container.register_instance[BeanList[ConfigurationProvider]](arg_parse_provider)
     if args.config_path is not None:
@@ -38,4 +38,11 @@ class PreprocessingConfig():
         ["normalization_std"],
         default=(0.229, 0.224, 0.225),
         description="The image tensor normalization standard deviation"
+    )
+    thumbnail_min_size: int = Configurable[int](
+        ["thumbnail_min_size"],
+        default=0,
+        description="Minimum length of the shorter side of the thumbnail embedded into an image's EXIF metadata for "
+                    "the thumbnail to be used as the network's input instead of the image itself, or 0 to always "
+                    "decode the image"
     )
\ No newline at end of file
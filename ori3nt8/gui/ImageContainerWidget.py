@@ -13,17 +13,16 @@
 #  limitations under the License.
 
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Optional, Tuple
 
 import PySide2
-from PySide2.QtCore import QRect, QPointF
-from PySide2.QtGui import QImage, QPainter, Qt, QPen, QPalette
+from PySide2.QtCore import QRectF, QPointF, QSize
+from PySide2.QtGui import QImage, QPainter, Qt, QPen, QPalette, QPixmap
 from PySide2.QtWidgets import QWidget
 from grundzeug.container.di import Inject
 from typing_extensions import Annotated
 
 from ori3nt8.gui.metadata.common import Metadata, AbstractMetadataStorage
-from ori3nt8.gui.metadata.sql import SqliteMetadataStorage
 from ori3nt8.gui.utils.rendering import draw_text
 from ori3nt8.gui.runnables.workers import ImageWorkers
 from ori3nt8.utils.metadata import load_exif_data
@@ -35,6 +34,9 @@ ORIENTATION_TO_STR = {
     3: "Rotated counter-clockwise"
 }
 
+# The number of unwritten orientation changes above which the status bar warns that writing is falling behind.
+WRITE_BACKLOG_WARNING_THRESHOLD = 3
+
 
 class ImageContainerWidget(QWidget):
     def __init__(
@@ -46,9 +48,18 @@ class ImageContainerWidget(QWidget):
         super().__init__()
         self.status_bar_callback = status_bar_callback
         self.image: Optional[QImage] = None
+        # The image scaled down to the size of the widget, and the key of the scaling request that produced it.
+        self.display_pixmap: Optional[QPixmap] = None
+        self.display_pixmap_key: Optional[Tuple[int, int, int, int, float]] = None
+        self.requested_display_pixmap_key: Optional[Tuple[int, int, int, int, float]] = None
+        # The thumbnail embedded into the image that is being loaded, shown until the image itself has been decoded.
+        self.preview_image: Optional[QImage] = None
+        self.preview_orientation: int = 0
         self.path: Optional[Path] = None
+        self.requested_path: Optional[Path] = None
         self.orientation: int = 0
         self.suggested_orientation: Optional[int] = None
+        self.pending_suggested_orientation: Optional[int] = None
         self.flip: int = 0
         self.original_orientation: int = 0
         self.orientation_was_selected_manually: bool = False
@@ -58,7 +69,9 @@ class ImageContainerWidget(QWidget):
         self.apply_next_orientation_suggestion: bool = False
 
         self.orientation_prediction_working_count = 0
+        self.write_backlog = 0
         self._image_workers = image_workers
+        self._image_workers.metadata_replacement_backlog_changed.connect(self.update_write_backlog)
 
         self.metadata_storage_engine: AbstractMetadataStorage = metadata_storage_engine
 
@@ -67,17 +80,49 @@ class ImageContainerWidget(QWidget):
     def set_image_path(self, path: Path):
         path = path.absolute()
         self.apply_next_orientation_suggestion = False
+        if self.path is not None:
+            # The user is done with the previous image, there is no point in waiting for further changes
+            self._image_workers.flush_metadata_replacements(self.path)
         if not path.is_file():
+            self.requested_path = None
             self.clear_image()
             return
         self.loading = True
-        self.repaint()
+        self.requested_path = path
+        self.pending_suggested_orientation = None
+        self.preview_image = None
+        self.update()
 
         self._image_workers.schedule_image_reading(path, self._finish_loading_image)
+        if self.loading:
+            self._image_workers.schedule_thumbnail_reading(path, self.show_preview)
+        # The network works on a separately decoded, much smaller image, so it doesn't have to wait for the display
+        # decode to finish.
+        self._image_workers.schedule_suggestion_prediction(
+            path=path,
+            result_changed_callback=self.update_suggested_orientation,
+            processing_started_callback=self.orientation_prediction_processing_started,
+            processing_completed_callback=self.orientation_prediction_processing_completed,
+        )
+
+    def show_preview(self, preview_image: QImage, orientation: int, path: str):
+        """
+        Shows the thumbnail embedded into the image's EXIF metadata while the image itself is being decoded.
+        """
+        if Path(path) != self.requested_path or not self.loading:
+            # The user has switched to a different image, or this one has already been decoded
+            return
+        self.preview_image = preview_image
+        self.preview_orientation = orientation
+        self.update()
 
     def _finish_loading_image(self, image: QImage, path: str):
         path = Path(path)
+        if path != self.requested_path:
+            # The user has switched to a different image while this one was being decoded
+            return
         self.loading = False
+        self.preview_image = None
         if image.width() == 0:
             self.clear_image()
             return
@@ -95,19 +140,20 @@ class ImageContainerWidget(QWidget):
         self.orientation_was_selected_manually = metadata.orientation_was_selected_manually
         self.orientation_was_selected_automatically = metadata.orientation_was_selected_automatically
         self.set_orientation(orientation)
-        self.repaint()
-        self._image_workers.schedule_suggestion_prediction(
-            path=path,
-            orientation=orientation,
-            image=image,
-            result_changed_callback=self.update_suggested_orientation,
-            processing_started_callback=self.orientation_prediction_processing_started,
-            processing_completed_callback=self.orientation_prediction_processing_completed,
-        )
+        self.update()
         self.update_progressbar()
 
+        if self.pending_suggested_orientation is not None and path == self.requested_path:
+            suggested_orientation = self.pending_suggested_orientation
+            self.pending_suggested_orientation = None
+            self.update_suggested_orientation(suggested_orientation, str(path))
+
     def clear_image(self):
         self.image = None
+        self.preview_image = None
+        self.display_pixmap = None
+        self.display_pixmap_key = None
+        self.requested_display_pixmap_key = None
         self.path = None
         self.flip = 0
         self.original_orientation = 0
@@ -116,7 +162,7 @@ class ImageContainerWidget(QWidget):
         self.orientation_was_selected_automatically = False
         self.set_orientation(0)
         self.update_progressbar()
-        self.repaint()
+        self.update()
 
     def set_apply_automatically(self, apply_automatically):
         self.apply_automaticaly = apply_automatically
@@ -124,9 +170,12 @@ class ImageContainerWidget(QWidget):
     def update_suggested_orientation(
             self,
             suggested_orientation: int,
-            original_orientation: int,
             path: str
     ):
+        if self.loading and str(self.requested_path) == path:
+            # The suggestion is ready before the image itself, apply it once the image has been loaded
+            self.pending_suggested_orientation = suggested_orientation
+            return
         if str(self.path) != path:
             # Outdated analysis: the user has switched to a different image, discard
             return
@@ -140,7 +189,7 @@ class ImageContainerWidget(QWidget):
             self.apply_next_orientation_suggestion = False
             self.set_orientation(suggested_orientation)
         self.update_progressbar()
-        self.repaint()
+        self.update()
 
         self.dump_metadata()
 
@@ -152,7 +201,7 @@ class ImageContainerWidget(QWidget):
         self.orientation_was_selected_manually = False
         self.orientation_was_selected_automatically = True
         self.set_orientation(self.suggested_orientation)
-        self.repaint()
+        self.update()
 
         self.dump_metadata()
 
@@ -169,6 +218,8 @@ class ImageContainerWidget(QWidget):
 
     def set_orientation(self, orientation):
         self.orientation = orientation
+        # Rotating the image by 90 degrees changes the size that it should be scaled to
+        self.request_display_pixmap()
 
         if self.image is not None:
             if self.orientation is not None:
@@ -179,6 +230,50 @@ class ImageContainerWidget(QWidget):
                 )
         self.update_progressbar()
 
+    def _get_display_pixmap_key(self) -> Optional[Tuple[int, int, int, int, float]]:
+        if self.image is None or self.width() <= 0 or self.height() <= 0:
+            return None
+        return self.image.cacheKey(), self.orientation % 2, self.width(), self.height(), self.devicePixelRatioF()
+
+    def request_display_pixmap(self):
+        """
+        Scales the image to the current size of the widget in the background, unless it has already been scaled to it.
+        """
+        key = self._get_display_pixmap_key()
+        if key is None or key == self.display_pixmap_key or key == self.requested_display_pixmap_key:
+            return
+        self.requested_display_pixmap_key = key
+        _, rotated, width, height, device_pixel_ratio = key
+        if rotated:
+            width, height = height, width
+        self._image_workers.schedule_image_scaling(
+            image=self.image,
+            size=QSize(round(width * device_pixel_ratio), round(height * device_pixel_ratio)),
+            key=key,
+            processing_completed_callback=self._finish_scaling_image
+        )
+
+    def _finish_scaling_image(self, image: QImage, key: Tuple[int, int, int, int, float]):
+        if key != self._get_display_pixmap_key():
+            # The widget has been resized, or the image has been replaced or rotated in the meantime
+            return
+        self.display_pixmap = QPixmap.fromImage(image)
+        self.display_pixmap.setDevicePixelRatio(key[-1])
+        self.display_pixmap_key = key
+        self.update()
+
+    def resizeEvent(self, event: PySide2.QtGui.QResizeEvent):
+        super().resizeEvent(event)
+        self.request_display_pixmap()
+
+    def finish_pending_writes(self):
+        self._image_workers.wait_for_metadata_replacements()
+        self.metadata_storage_engine.flush()
+
+    def update_write_backlog(self, write_backlog: int):
+        self.write_backlog = write_backlog
+        self.update_progressbar()
+
     def orientation_prediction_processing_started(self):
         self.orientation_prediction_working_count += 1
         self.update_progressbar()
@@ -198,13 +293,15 @@ class ImageContainerWidget(QWidget):
             message += "working on suggestion..."
         else:
             message += f"suggested orientation: {ORIENTATION_TO_STR[self.suggested_orientation]}"
+        if self.write_backlog > WRITE_BACKLOG_WARNING_THRESHOLD:
+            message += f" ({self.write_backlog} images are waiting for their orientation to be saved)"
         self.status_bar_callback(message)
 
     def rotate_clockwise(self):
         self.orientation_was_selected_manually = True
         self.orientation_was_selected_automatically = False
         self.set_orientation((self.orientation + 1) % 4)
-        self.repaint()
+        self.update()
         self.update_progressbar()
 
         self.dump_metadata()
@@ -213,7 +310,7 @@ class ImageContainerWidget(QWidget):
         self.orientation_was_selected_manually = True
         self.orientation_was_selected_automatically = False
         self.set_orientation((self.orientation - 1) % 4)
-        self.repaint()
+        self.update()
         self.update_progressbar()
 
         self.dump_metadata()
@@ -223,23 +320,22 @@ class ImageContainerWidget(QWidget):
 
         if self.orientation is None:
             return
-        if self.image is not None:
+        if self.loading and self.preview_image is not None:
             painter.save()
-            image_width = self.image.width()
-            image_height = self.image.height()
-            if self.orientation % 2 == 0:
-                scale = min(self.width() / image_width, self.height() / image_height)
+            target_rect = self._transform_to_image_rect(painter, self.preview_image, self.preview_orientation)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(target_rect, self.preview_image)
+            painter.restore()
+        elif self.image is not None:
+            painter.save()
+            target_rect = self._transform_to_image_rect(painter, self.image, self.orientation)
+            target_width = target_rect.width()
+            target_height = target_rect.height()
+            if self.display_pixmap is not None and self.display_pixmap_key[0] == self.image.cacheKey():
+                # Until the image is scaled to the new size of the widget, the pixmap scaled to the old size is used
+                painter.drawPixmap(target_rect, self.display_pixmap, QRectF(self.display_pixmap.rect()))
             else:
-                scale = min(self.width() / image_height, self.height() / image_width)
-
-            target_width = image_width * scale
-            target_height = image_height * scale
-            padding_left = (self.width() - target_width) // 2
-            padding_top = (self.height() - target_height) // 2
-            painter.translate(self.width() / 2, self.height() / 2)
-            painter.rotate(90 * self.orientation)
-            painter.translate(-self.width() / 2, -self.height() / 2)
-            painter.drawImage(QRect(padding_left, padding_top, target_width, target_height), self.image)
+                painter.drawImage(target_rect, self.image)
             painter.restore()
 
             if self.original_orientation is not None:
@@ -273,6 +369,27 @@ class ImageContainerWidget(QWidget):
             draw_text(painter, self.width() / 2, self.height() / 2, Qt.AlignVCenter | Qt.AlignHCenter, "Loading...")
             painter.restore()
 
+    def _transform_to_image_rect(self, painter: QPainter, image: QImage, orientation: int) -> QRectF:
+        """
+        Rotates the painter around the center of the widget and returns the rectangle that the image should be drawn
+        into, so that the rotated image fits into the widget.
+        """
+        image_width = image.width()
+        image_height = image.height()
+        if orientation % 2 == 0:
+            scale = min(self.width() / image_width, self.height() / image_height)
+        else:
+            scale = min(self.width() / image_height, self.height() / image_width)
+
+        target_width = image_width * scale
+        target_height = image_height * scale
+        padding_left = (self.width() - target_width) // 2
+        padding_top = (self.height() - target_height) // 2
+        painter.translate(self.width() / 2, self.height() / 2)
+        painter.rotate(90 * orientation)
+        painter.translate(-self.width() / 2, -self.height() / 2)
+        return QRectF(padding_left, padding_top, target_width, target_height)
+
     def render_orientation_indicator(
             self,
             painter,
@@ -15,14 +15,17 @@
 from pathlib import Path
 
 from PySide2.QtCore import QUrl
-from PySide2.QtGui import QIcon, QDesktopServices
-from PySide2.QtWidgets import QMainWindow, QFileDialog, QFileSystemModel, QHeaderView, QMessageBox
+from PySide2.QtGui import QIcon, QDesktopServices, QCloseEvent
+from PySide2.QtWidgets import QMainWindow, QFileDialog, QFileSystemModel, QHeaderView, QMessageBox, QLabel
 from grundzeug.container import Injector
 from grundzeug.container.di import Inject
 from typing_extensions import Annotated
 
 from ori3nt8.gui.AboutDialog import AboutDialog
 from ori3nt8.gui.ImageContainerWidget import ImageContainerWidget
+from ori3nt8.gui.inference.prediction import TestTimeAugmentationConfig, TTA_ADAPTIVE
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage
+from ori3nt8.gui.runnables.workers import ImageWorkers
 from ori3nt8.gui.ui.Ui_MainWindow import Ui_MainWindow
 from ori3nt8.gui.utils.qtree import ModelIndexNavigator
 from ori3nt8.utils.resources import resource_path
@@ -31,8 +34,19 @@ WEBSITE_URL = "https://ori3nt8.nickguletskii.com"
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, injector: Annotated[Injector, Inject]):
+    def __init__(
+            self,
+            injector: Annotated[Injector, Inject],
+            metadata_storage_engine: Annotated[AbstractMetadataStorage, Inject],
+            image_workers: Annotated[ImageWorkers, Inject],
+            tta_config: Annotated[TestTimeAugmentationConfig, Inject]
+    ):
         super().__init__()
+        self.metadata_storage_engine = metadata_storage_engine
+        self.image_workers = image_workers
+        self.show_tta_statistics = tta_config.mode == TTA_ADAPTIVE
+        # Whether the user is going through the images backwards, which determines the images that are prefetched.
+        self.navigating_backwards = False
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         appIcon = QIcon(str(resource_path() / "ori3nt8.svg"))
@@ -55,6 +69,16 @@ class MainWindow(QMainWindow):
             self.ui.fileTreeView
         )
 
+        self.analysis_progress_label = QLabel(self)
+        self.ui.statusbar.addPermanentWidget(self.analysis_progress_label)
+        self.image_workers.directory_analysis_progress_changed.connect(self.update_analysis_progress)
+
+        self.model_status_label = QLabel("Loading the model...", self)
+        self.ui.statusbar.addPermanentWidget(self.model_status_label)
+        self.image_workers.model_ready.connect(self.model_status_label.hide)
+        self.image_workers.model_loading_failed.connect(self.show_model_loading_error)
+        self.image_workers.load_model()
+
     def launch_website(self):
         QDesktopServices.openUrl(QUrl(WEBSITE_URL))
 
@@ -78,6 +102,8 @@ class MainWindow(QMainWindow):
             self.open_directory(dir)
 
     def open_directory(self, dir):
+        # Load the metadata of the whole directory at once, instead of querying it for every image that gets opened
+        self.metadata_storage_engine.preload(Path(dir).absolute())
         model = QFileSystemModel(self.ui.fileTreeView)
         model.setNameFilters(["*.jpg", "*.JPG"])
         model.setRootPath(dir)
@@ -90,18 +116,42 @@ class MainWindow(QMainWindow):
         self.ui.fileTreeView.hideColumn(2)
         self.ui.fileTreeView.hideColumn(3)
         self.ui.fileTreeView.hideColumn(4)
+        self.image_workers.schedule_directory_analysis(Path(dir).absolute())
 
     def next_item(self):
+        self.navigating_backwards = False
         idx = self.ui.fileTreeView.currentIndex()
         self.file_tree_view_navigator.next_model_index(idx)
 
     def previous_item(self):
+        self.navigating_backwards = True
         idx = self.ui.fileTreeView.currentIndex()
         self.file_tree_view_navigator.prev_model_index(idx)
 
     def current_file_changed(self):
-        path = self.ui.fileTreeView.model().filePath(self.ui.fileTreeView.currentIndex())
+        idx = self.ui.fileTreeView.currentIndex()
+        path = self.ui.fileTreeView.model().filePath(idx)
         self.image_widget.set_image_path(Path(path))
+        if Path(path).is_file():
+            self.image_workers.schedule_prefetching(idx, reverse=self.navigating_backwards)
 
     def update_status_bar(self, message):
         self.ui.statusbar.showMessage(message)
+
+    def update_analysis_progress(self, analysed: int, total: int, full_tta_fraction: float):
+        if analysed < total:
+            message = f"Analysed {analysed} of {total} images"
+        else:
+            message = f"Analysed all {total} images"
+        if self.show_tta_statistics:
+            message += f" ({full_tta_fraction:.0%} of the predictions needed all four rotations)"
+        self.analysis_progress_label.setText(message)
+
+    def show_model_loading_error(self, message: str):
+        self.model_status_label.setText("Couldn't load the model")
+        QMessageBox.critical(self, "Couldn't load the model", message)
+
+    def closeEvent(self, event: QCloseEvent):
+        self.image_workers.cancel_directory_analysis()
+        self.image_widget.finish_pending_writes()
+        super().closeEvent(event)
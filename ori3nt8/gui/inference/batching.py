@@ -0,0 +1,127 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject, InjectAnnotation
+from typing_extensions import Annotated
+
+from ori3nt8.gui.inference.executors import AbstractExecutor
+
+# The name of the bean that holds the executor wrapped by BatchingExecutor.
+BACKEND_EXECUTOR_BEAN_NAME = "backend"
+
+
+@configuration(["inference", "batching"])
+class BatchingConfig():
+    max_batch_size: int = Configurable[int](
+        ["max_batch_size"],
+        default=64,
+        description="Maximum number of tensors that will be passed into the backend executor in a single call"
+    )
+    max_wait_ms: float = Configurable[float](
+        ["max_wait_ms"],
+        default=5.0,
+        description="Maximum number of milliseconds to wait for more requests before running an incomplete batch"
+    )
+
+
+class _BatchRequest():
+    def __init__(self, images: np.ndarray):
+        self.images = images
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class BatchingExecutor(AbstractExecutor):
+    def __init__(
+            self,
+            executor: Annotated[AbstractExecutor, InjectAnnotation[AbstractExecutor].named(BACKEND_EXECUTOR_BEAN_NAME)],
+            batching_config: Annotated[BatchingConfig, Inject]
+    ):
+        """
+        Merges the tensors from concurrent calls into a single call to the backend executor, and splits the results
+        back.
+
+        A batch is executed once it reaches `max_batch_size` tensors or once its first request has been waiting for
+        `max_wait_ms` milliseconds, whichever comes first. A single request that is larger than `max_batch_size` is
+        executed on its own.
+
+        Parameters
+        ----------
+        executor
+            The executor that will run the merged batches.
+        batching_config
+            The batch size and wait time limits.
+        """
+        self.executor: AbstractExecutor = executor
+        self.max_batch_size = batching_config.max_batch_size
+        self.max_wait = batching_config.max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="batching-executor", daemon=True)
+        self._thread.start()
+
+    def __call__(self, images: np.ndarray) -> np.ndarray:
+        request = _BatchRequest(images)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self):
+        pending: Optional[_BatchRequest] = None
+        while True:
+            first_request = pending if pending is not None else self._queue.get()
+            pending = None
+            batch = [first_request]
+            batch_size = len(first_request.images)
+            deadline = time.monotonic() + self.max_wait
+
+            while batch_size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    # Requests that are already enqueued are always merged, even if the deadline has passed.
+                    request = self._queue.get(block=timeout > 0, timeout=timeout if timeout > 0 else None)
+                except queue.Empty:
+                    break
+                if batch_size + len(request.images) > self.max_batch_size:
+                    pending = request
+                    break
+                batch.append(request)
+                batch_size += len(request.images)
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[_BatchRequest]):
+        try:
+            if len(batch) == 1:
+                batch[0].result = self.executor(batch[0].images)
+            else:
+                results = self.executor(np.concatenate([request.images for request in batch], axis=0))
+                split_points = np.cumsum([len(request.images) for request in batch])[:-1]
+                for request, result in zip(batch, np.split(results, split_points, axis=0)):
+                    request.result = result
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
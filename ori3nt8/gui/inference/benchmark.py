@@ -0,0 +1,99 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+import numpy as np
+from grundzeug.config import configuration, Configurable
+
+from ori3nt8.common.containers import build_container
+from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.executors import InferenceConfig, OnnxRuntimeConfig, get_executor_type, EXECUTOR_CAFFE2, \
+    EXECUTOR_ONNXRUNTIME
+
+# Each image is passed into the network in four rotations.
+TENSORS_PER_IMAGE = 4
+
+
+@configuration(["benchmark"])
+class BenchmarkConfig():
+    executors: str = Configurable[str](
+        ["executors"],
+        default=f"{EXECUTOR_CAFFE2},{EXECUTOR_ONNXRUNTIME}",
+        description="Comma-separated list of the executors to benchmark"
+    )
+    batch_sizes: str = Configurable[str](
+        ["batch_sizes"],
+        default="1,4,64",
+        description="Comma-separated list of the batch sizes (in tensors) to benchmark"
+    )
+    warmup_iterations: int = Configurable[int](
+        ["warmup_iterations"],
+        default=5,
+        description="Number of untimed calls made before measuring"
+    )
+    iterations: int = Configurable[int](
+        ["iterations"],
+        default=50,
+        description="Number of timed calls per executor and batch size"
+    )
+
+
+def benchmark_executor(executor, batch: np.ndarray, warmup_iterations: int, iterations: int) -> np.ndarray:
+    """
+    Calls the executor on the batch repeatedly.
+
+    Returns
+    -------
+    The latencies of the timed calls, in seconds.
+    """
+    for _ in range(warmup_iterations):
+        executor(batch)
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start_time = time.perf_counter()
+        executor(batch)
+        latencies[i] = time.perf_counter() - start_time
+    return latencies
+
+
+def main() -> None:
+    container = build_container([BenchmarkConfig, InferenceConfig, OnnxRuntimeConfig, PreprocessingConfig])
+    benchmark_config: BenchmarkConfig = container.resolve[BenchmarkConfig]()
+    crop_to = container.resolve[PreprocessingConfig.crop_to]()
+    batch_sizes = [int(batch_size) for batch_size in benchmark_config.batch_sizes.split(",")]
+
+    print(f"{'executor':<16}{'batch':>8}{'mean ms':>12}{'p50 ms':>12}{'p95 ms':>12}{'images/s':>12}")
+    for executor_name in benchmark_config.executors.split(","):
+        executor = container.inject(get_executor_type(executor_name.strip()))()
+        for batch_size in batch_sizes:
+            batch = np.random.normal(size=(batch_size, 3, crop_to, crop_to)).astype(np.float32)
+            latencies = benchmark_executor(
+                executor,
+                batch,
+                warmup_iterations=benchmark_config.warmup_iterations,
+                iterations=benchmark_config.iterations
+            )
+            images_per_second = batch_size / TENSORS_PER_IMAGE / np.mean(latencies)
+            print(
+                f"{executor_name:<16}{batch_size:>8}"
+                f"{np.mean(latencies) * 1000:>12.2f}"
+                f"{np.percentile(latencies, 50) * 1000:>12.2f}"
+                f"{np.percentile(latencies, 95) * 1000:>12.2f}"
+                f"{images_per_second:>12.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
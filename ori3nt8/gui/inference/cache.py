@@ -0,0 +1,145 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+import appdirs
+import numpy as np
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.executors import InferenceConfig
+from ori3nt8.gui.inference.prediction import TestTimeAugmentationConfig, TTA_ADAPTIVE
+from ori3nt8.gui.inference.prepared import hash_model_file
+from ori3nt8.utils.jpeg import hash_image_content
+
+
+class PredictionCache():
+    def __init__(
+            self,
+            inference_config: Annotated[InferenceConfig, Inject],
+            preprocessing_config: Annotated[PreprocessingConfig, Inject],
+            tta_config: Annotated[TestTimeAugmentationConfig, Inject]
+    ):
+        """
+        Persistently stores the orientation probabilities predicted for images.
+
+        Predictions are keyed by a hash of the image's content (excluding its EXIF metadata, so that changing the
+        orientation of an image doesn't invalidate them) and by a hash of the model file. To avoid reading the images,
+        the content hashes are in turn cached by path, size and modification time.
+
+        Parameters
+        ----------
+        inference_config
+            The inference configuration, which determines the model that produces the predictions.
+        preprocessing_config
+            The preprocessing configuration, which determines whether the predictions are made using the thumbnails.
+        tta_config
+            The test time augmentation configuration, which determines whether the predictions are made using all four
+            rotations of the images.
+        """
+        self.model_version = hash_model_file(inference_config.model_path)
+        if preprocessing_config.thumbnail_min_size > 0:
+            # Predictions made using the thumbnails are less accurate, so they are kept separately
+            self.model_version += f"+thumbnail{preprocessing_config.thumbnail_min_size}"
+        if tta_config.mode == TTA_ADAPTIVE:
+            # So are the predictions that were made without running the network on the other rotations of the images
+            self.model_version += f"+adaptive{tta_config.threshold}"
+
+        database_path = Path(appdirs.user_cache_dir("ori3nt8")) / "predictions.db"
+        database_path.parent.mkdir(parents=True, exist_ok=True)
+        # The connection is shared by the inference threads, so access to it is serialized using a lock.
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(database_path), check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS content_keys ("
+                "path TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "content_key TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "content_key TEXT NOT NULL, "
+                "model_version TEXT NOT NULL, "
+                "probabilities BLOB NOT NULL, "
+                "PRIMARY KEY (content_key, model_version))"
+            )
+
+    def _content_key(self, path: Path) -> str:
+        stat = path.stat()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT content_key FROM content_keys WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        content_key = hash_image_content(path)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO content_keys (path, size, mtime_ns, content_key) VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, content_key)
+            )
+        return content_key
+
+    def load(self, path: Path) -> Optional[np.ndarray]:
+        """
+        Retrieves the cached orientation probabilities of an image.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+
+        Returns
+        -------
+        The probabilities of each orientation, or None if the image hasn't been analysed by the current model yet.
+        """
+        content_key = self._content_key(Path(path))
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT probabilities FROM predictions WHERE content_key = ? AND model_version = ?",
+                (content_key, self.model_version)
+            ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def dump(self, path: Path, probabilities: np.ndarray) -> None:
+        """
+        Stores the orientation probabilities of an image.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+        probabilities
+            The probabilities of each orientation, as predicted by the current model.
+        """
+        content_key = self._content_key(Path(path))
+        blob = np.ascontiguousarray(probabilities, dtype=np.float32).tobytes()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO predictions (content_key, model_version, probabilities) VALUES (?, ?, ?)",
+                (content_key, self.model_version, blob)
+            )
@@ -12,14 +12,91 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import json
 from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
 
 import numpy as np
-import onnx
-from caffe2.python.onnx import backend as backend
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
 
+from ori3nt8.gui.inference.prepared import PreparedModelCache
 from ori3nt8.utils.resources import resource_path
 
+EXECUTOR_CAFFE2 = "caffe2"
+EXECUTOR_ONNXRUNTIME = "onnxruntime"
+
+GRAPH_STANDARD = "standard"
+GRAPH_END_TO_END = "end_to_end"
+
+# The names of the members of onnxruntime.GraphOptimizationLevel, which isn't imported until an executor is created.
+ONNXRUNTIME_GRAPH_OPTIMIZATION_LEVELS = {
+    "disabled": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+@configuration(["inference"])
+class InferenceConfig():
+    executor: str = Configurable[str](
+        ["executor"],
+        default=EXECUTOR_CAFFE2,
+        description=f"The backend that runs the network: \"{EXECUTOR_CAFFE2}\" or \"{EXECUTOR_ONNXRUNTIME}\""
+    )
+    model: str = Configurable[str](
+        ["model"],
+        default="network.onnx",
+        description="Name of the ONNX model file in the resources directory, e.g. network_int8.onnx for the quantized "
+                    "model (which requires ONNX Runtime)"
+    )
+    graph: str = Configurable[str](
+        ["graph"],
+        default=GRAPH_STANDARD,
+        description=f"The kind of graph stored in the model file: \"{GRAPH_STANDARD}\" for the classifier alone, or "
+                    f"\"{GRAPH_END_TO_END}\" for a graph that includes the preprocessing and test time augmentation"
+    )
+
+    cache_prepared_model: int = Configurable[int](
+        ["cache_prepared_model"],
+        default=1,
+        description="1 to store the form into which the executor converts the model in the user's cache directory, so "
+                    "that the conversion is only performed once, 0 to convert the model on every launch"
+    )
+
+    @property
+    def model_path(self) -> Path:
+        return resource_path() / self.model
+
+    def get_prepared_model_cache(self) -> Optional[PreparedModelCache]:
+        if not self.cache_prepared_model:
+            return None
+        return PreparedModelCache(self.model_path)
+
+
+@configuration(["inference", "onnxruntime"])
+class OnnxRuntimeConfig():
+    intra_op_num_threads: int = Configurable[int](
+        ["intra_op_num_threads"],
+        default=0,
+        description="Number of threads used to parallelize the execution of a single operator, 0 to let ONNX Runtime "
+                    "decide"
+    )
+    inter_op_num_threads: int = Configurable[int](
+        ["inter_op_num_threads"],
+        default=0,
+        description="Number of threads used to execute independent operators in parallel, 0 to let ONNX Runtime "
+                    "decide"
+    )
+    graph_optimization_level: str = Configurable[str](
+        ["graph_optimization_level"],
+        default="all",
+        description="ONNX Runtime's graph optimization level: \"disabled\", \"basic\", \"extended\" or \"all\""
+    )
+
 
 class AbstractExecutor(ABC):
     @abstractmethod
@@ -27,11 +104,166 @@ class AbstractExecutor(ABC):
         raise NotImplementedError()
 
 
-class Caffe2Executor():
-    def __init__(self):
-        onnx_model = onnx.load(str(resource_path() / "network.onnx"))
-        self.rep = backend.prepare(onnx_model, device="CPU")
+def get_onnx_opset_version(onnx_model) -> int:
+    """
+    Returns the version of the default ONNX operator set that the model uses.
+    """
+    for opset in onnx_model.opset_import:
+        if opset.domain in ("", "ai.onnx"):
+            return opset.version
+    raise ValueError("The model doesn't import the default ONNX operator set")
+
+
+class Caffe2Executor(AbstractExecutor):
+    def __init__(self, inference_config: Annotated[InferenceConfig, Inject]):
+        """
+        Runs the network using Caffe2.
+
+        The model is converted into a pair of Caffe2 nets: the init net, which fills in the weights, and the predict
+        net. Unless disabled, the nets are serialized into the prepared model cache, so that later launches don't have
+        to load the ONNX model or convert it.
+        """
+        # The backends are imported lazily, since importing them noticeably slows down the startup
+        from caffe2.proto import caffe2_pb2
+        from caffe2.python.onnx.backend_rep import Caffe2Rep
+        from caffe2.python.onnx.workspace import Workspace
+        import torch
+
+        cache = inference_config.get_prepared_model_cache()
+        # The conversion is implemented by Caffe2, which is distributed as part of PyTorch. The version is taken from
+        # the module rather than from the distribution metadata, which isn't bundled into the frozen application.
+        backend_version = torch.__version__
+
+        if cache is not None:
+            init_net_path = cache.get_path(EXECUTOR_CAFFE2, backend_version, "CPU", ".init_net.pb")
+            predict_net_path = cache.get_path(EXECUTOR_CAFFE2, backend_version, "CPU", ".predict_net.pb")
+            # Written last, so its presence indicates that the nets have been written
+            inputs_path = cache.get_path(EXECUTOR_CAFFE2, backend_version, "CPU", ".inputs.json")
+
+        if cache is not None and inputs_path.exists():
+            init_net = caffe2_pb2.NetDef()
+            init_net.ParseFromString(init_net_path.read_bytes())
+            predict_net = caffe2_pb2.NetDef()
+            predict_net.ParseFromString(predict_net_path.read_bytes())
+            inputs = json.loads(inputs_path.read_text())
+        else:
+            init_net, predict_net, inputs = self._convert(inference_config.model_path)
+            if cache is not None:
+                cache.write(init_net_path, init_net.SerializeToString())
+                cache.write(predict_net_path, predict_net.SerializeToString())
+                cache.write(inputs_path, json.dumps(inputs).encode())
+
+        # Unlike backend.prepare, which loads the weights straight into the workspace, this fills them in using the
+        # init net when the network is run for the first time
+        self.rep = Caffe2Rep(init_net, predict_net, Workspace(), inputs)
+
+    @staticmethod
+    def _convert(model_path: Path):
+        import onnx
+        from caffe2.python.onnx import backend
+
+        onnx_model = onnx.load(str(model_path))
+        init_net, predict_net = backend.Caffe2Backend.onnx_graph_to_caffe2_net(
+            onnx_model,
+            device="CPU",
+            opset_version=get_onnx_opset_version(onnx_model)
+        )
+        initialized = {initializer.name for initializer in onnx_model.graph.initializer}
+        inputs = [value_info.name for value_info in onnx_model.graph.input if value_info.name not in initialized]
+        return init_net, predict_net, inputs
 
     def __call__(self, images: np.ndarray) -> np.ndarray:
         results = self.rep.run(images)
-        return np.squeeze(results, axis=0)
+        return results[0]
+
+
+class OnnxRuntimeSessionExecutor(AbstractExecutor):
+    def __init__(self, session):
+        """
+        Runs the network using an existing ONNX Runtime inference session (e.g. one created for a model that has just
+        been exported).
+        """
+        self.session = session
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+
+    def __call__(self, images: np.ndarray) -> np.ndarray:
+        results, = self.session.run([self.output_name], {self.input_name: images})
+        return results
+
+
+class OnnxRuntimeExecutor(OnnxRuntimeSessionExecutor):
+    def __init__(
+            self,
+            inference_config: Annotated[InferenceConfig, Inject],
+            onnx_runtime_config: Annotated[OnnxRuntimeConfig, Inject]
+    ):
+        """
+        Runs the network using ONNX Runtime.
+
+        Unless disabled, the model optimized by ONNX Runtime is stored in the prepared model cache, and later launches
+        load the optimized model instead of optimizing the original one again.
+        """
+        if onnx_runtime_config.graph_optimization_level not in ONNXRUNTIME_GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level: {onnx_runtime_config.graph_optimization_level}")
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = onnx_runtime_config.intra_op_num_threads
+        session_options.inter_op_num_threads = onnx_runtime_config.inter_op_num_threads
+        session_options.graph_optimization_level = getattr(
+            onnxruntime.GraphOptimizationLevel,
+            ONNXRUNTIME_GRAPH_OPTIMIZATION_LEVELS[onnx_runtime_config.graph_optimization_level]
+        )
+
+        graph_optimization_level = onnx_runtime_config.graph_optimization_level
+        cache = inference_config.get_prepared_model_cache()
+        if cache is None or graph_optimization_level == "disabled":
+            session = onnxruntime.InferenceSession(str(inference_config.model_path), session_options)
+        else:
+            # The optimizations performed at the "all" level may be specific to the CPU, so they are performed whenever
+            # the optimized model is loaded instead
+            offline_level = "extended" if graph_optimization_level == "all" else graph_optimization_level
+            optimized_model_path = cache.get_path(EXECUTOR_ONNXRUNTIME, onnxruntime.__version__, offline_level, ".onnx")
+            if not optimized_model_path.exists():
+                self._optimize(inference_config.model_path, offline_level, optimized_model_path, cache)
+            if graph_optimization_level != "all":
+                session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            session = onnxruntime.InferenceSession(str(optimized_model_path), session_options)
+        super().__init__(session)
+
+    @staticmethod
+    def _optimize(
+            model_path: Path,
+            graph_optimization_level: str,
+            optimized_model_path: Path,
+            cache: PreparedModelCache
+    ):
+        import onnxruntime
+
+        temporary_path = cache.get_temporary_path(optimized_model_path)
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = getattr(
+            onnxruntime.GraphOptimizationLevel,
+            ONNXRUNTIME_GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+        )
+        session_options.optimized_model_filepath = str(temporary_path)
+        # Creating the session writes the optimized model
+        onnxruntime.InferenceSession(str(model_path), session_options)
+        cache.commit(temporary_path, optimized_model_path)
+
+
+EXECUTORS = {
+    EXECUTOR_CAFFE2: Caffe2Executor,
+    EXECUTOR_ONNXRUNTIME: OnnxRuntimeExecutor,
+}
+
+
+def get_executor_type(name: str) -> type:
+    """
+    Returns the :py:class:`AbstractExecutor` implementation that corresponds to the value of
+    :py:attr:`InferenceConfig.executor`.
+    """
+    if name not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {name}. Supported executors: {', '.join(EXECUTORS)}")
+    return EXECUTORS[name]
@@ -0,0 +1,129 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+from typing import Callable, List, Optional
+
+from PySide2.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+from PySide2.QtGui import QImage, QColor
+from grundzeug.container import Injector
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.gui.inference.cache import PredictionCache
+from ori3nt8.gui.inference.prediction import OrientationPredictor
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(
+        orientation_predictor: Annotated[OrientationPredictor, Inject],
+        prediction_cache: Annotated[PredictionCache, Inject]
+):
+    """
+    Runs a prediction on a blank image, so that the lazy initialization performed by the backend during the first run
+    doesn't delay the first suggestion.
+
+    Injecting this function creates the predictor (loading the model) and the prediction cache (hashing the model).
+    The prediction isn't counted in the predictor's test time augmentation statistics.
+    """
+    image = QImage(orientation_predictor.preprocessing_pipeline.resize_to,
+                   orientation_predictor.preprocessing_pipeline.resize_to,
+                   QImage.Format_RGB32)
+    image.fill(QColor(0, 0, 0))
+    orientation_predictor.predict(image)
+    orientation_predictor.tta_statistics.reset()
+
+
+class ModelLoadingRunnableSignals(QObject):
+    loading_completed = Signal()
+    loading_failed = Signal(str)
+
+
+class ModelLoadingRunnable(QRunnable):
+    def __init__(self, injector: Injector):
+        super().__init__()
+        self.injector = injector
+        self.signals = ModelLoadingRunnableSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            self.injector.inject(warm_up)()
+        except Exception as e:
+            logger.exception("Couldn't load the model")
+            self.signals.loading_failed.emit(str(e))
+        else:
+            self.signals.loading_completed.emit()
+
+
+class ModelLoader(QObject):
+    ready = Signal()
+    # Emitted with the error message if the model couldn't be loaded.
+    failed = Signal(str)
+
+    def __init__(self, injector: Injector, parent: Optional[QObject] = None):
+        """
+        Loads and warms up the model on a background thread, so that the main window can be shown without waiting for
+        it.
+
+        Parameters
+        ----------
+        injector
+            The injector used to create the predictor and the prediction cache.
+        parent
+            The parent of the loader.
+        """
+        super().__init__(parent)
+        self._injector = injector
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(1)
+        self._runnable: Optional[ModelLoadingRunnable] = None
+        self._ready = False
+        self._pending_callbacks: List[Callable[[], None]] = []
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def load(self):
+        """
+        Starts loading the model, unless it is already being loaded.
+        """
+        if self._runnable is not None:
+            return
+        runnable = ModelLoadingRunnable(self._injector)
+        runnable.signals.loading_completed.connect(self._loading_completed)
+        runnable.signals.loading_failed.connect(self.failed)
+        # Keep the runnable (and its signals) alive until the loader is destroyed on the GUI thread
+        runnable.setAutoDelete(False)
+        self._runnable = runnable
+        self._thread_pool.start(runnable)
+
+    def call_when_ready(self, callback: Callable[[], None]):
+        """
+        Calls the callback immediately if the model has been loaded, or once it has been loaded otherwise. The
+        callbacks are called on the GUI thread, in the order in which they were registered.
+        """
+        if self._ready:
+            callback()
+        else:
+            self._pending_callbacks.append(callback)
+
+    def _loading_completed(self):
+        self._ready = True
+        callbacks, self._pending_callbacks = self._pending_callbacks, []
+        for callback in callbacks:
+            callback()
+        self.ready.emit()
@@ -0,0 +1,226 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+import numpy as np
+from PySide2.QtGui import QImage
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.gui.inference.executors import AbstractExecutor, GRAPH_STANDARD, GRAPH_END_TO_END
+from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
+
+TTA_FULL = "full"
+TTA_ADAPTIVE = "adaptive"
+
+
+@configuration(["inference", "tta"])
+class TestTimeAugmentationConfig():
+    mode: str = Configurable[str](
+        ["mode"],
+        default=TTA_FULL,
+        description=f"\"{TTA_FULL}\" to run the network on all four rotations of every image, or \"{TTA_ADAPTIVE}\" to "
+                    f"only run it on the other three rotations when the prediction for the image as it is isn't "
+                    f"confident enough"
+    )
+    threshold: float = Configurable[float](
+        ["threshold"],
+        default=0.95,
+        description="In the adaptive mode, the probability of the most likely orientation of the image as it is below "
+                    "which the other three rotations are run as well"
+    )
+
+
+class TestTimeAugmentationStatistics():
+    def __init__(self):
+        """
+        Counts the predictions and the predictions for which the network had to be run on all four rotations.
+        """
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.full_predictions = 0
+
+    def record(self, full: bool) -> None:
+        with self._lock:
+            self.predictions += 1
+            if full:
+                self.full_predictions += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.predictions = 0
+            self.full_predictions = 0
+
+    @property
+    def full_fraction(self) -> float:
+        """
+        The fraction of the predictions for which the network had to be run on all four rotations.
+        """
+        with self._lock:
+            return self.full_predictions / self.predictions if self.predictions > 0 else 0.0
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    # Imported lazily, since importing SciPy noticeably slows down the startup
+    import scipy.special
+
+    return scipy.special.softmax(logits, axis=-1)
+
+
+class OrientationPredictor():
+    def __init__(
+            self,
+            executor: Annotated[AbstractExecutor, Inject],
+            preprocessing_pipeline: Annotated[PreprocessingPipeline, Inject]
+    ):
+        """
+        Turns images into orientation probabilities by running the network on all four rotations of the image (test
+        time augmentation) and averaging the results.
+
+        The work is split into :py:meth:`prepare` and :py:meth:`infer` so that pipelines can run the NumPy
+        preprocessing and the network on different threads.
+
+        Parameters
+        ----------
+        executor
+            The executor that will run the network.
+        preprocessing_pipeline
+            The pipeline that converts images into input tensors.
+        """
+        self.executor: AbstractExecutor = executor
+        self.preprocessing_pipeline: PreprocessingPipeline = preprocessing_pipeline
+        self.tta_statistics = TestTimeAugmentationStatistics()
+
+    def prepare(self, image: QImage) -> np.ndarray:
+        """
+        Converts the image into the batch that should be passed into :py:meth:`infer`.
+        """
+        image = self.preprocessing_pipeline.resize_qimage(image)
+        return self.prepare_pixels(self.preprocessing_pipeline.qimage_to_numpy(image))
+
+    def prepare_pixels(self, arr: np.ndarray) -> np.ndarray:
+        """
+        Converts the pixels of a resized image (an HWC array, as returned by
+        :py:meth:`~ori3nt8.gui.inference.preprocessing.PreprocessingPipeline.qimage_to_numpy`) into the batch that
+        should be passed into :py:meth:`infer`.
+        """
+        arr = self.preprocessing_pipeline.preprocess(arr)
+        return self.create_batch_array(arr)
+
+    def infer(self, batched_arr: np.ndarray) -> np.ndarray:
+        """
+        Runs the network on a batch produced by :py:meth:`prepare`.
+
+        Returns
+        -------
+        The probabilities of each of the four orientations, indexed by the number of clockwise rotations.
+        """
+        res = self.executor(batched_arr)
+        self.tta_statistics.record(full=True)
+        return self.postprocess(res)
+
+    def predict(self, image: QImage) -> np.ndarray:
+        return self.infer(self.prepare(image))
+
+    def create_batch_array(self, arr: np.array) -> np.array:
+        arr1 = np.expand_dims(arr, axis=0)
+        arr2 = np.rot90(arr1, axes=(2, 3))
+        arr3 = np.rot90(arr2, axes=(2, 3))
+        arr4 = np.rot90(arr3, axes=(2, 3))
+        batched_arr = np.concatenate([arr1, arr2, arr3, arr4], axis=0)
+        return batched_arr
+
+    def postprocess(self, res: np.array) -> np.ndarray:
+        res = softmax(res)
+        for i in range(4):
+            res[i, :] = np.roll(res[i, :], -i)
+        res = np.mean(res, axis=0)
+        return res
+
+
+class EndToEndOrientationPredictor(OrientationPredictor):
+    """
+    Predicts orientations using a graph that performs the cropping, normalization and test time augmentation itself
+    (see :py:class:`~ori3nt8.training.end_to_end.EndToEndOrientationModel`), so only resizing is done in Python.
+    """
+
+    def prepare_pixels(self, arr: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(np.expand_dims(arr, axis=0))
+
+    def infer(self, images: np.ndarray) -> np.ndarray:
+        probabilities = self.executor(images)
+        self.tta_statistics.record(full=True)
+        return probabilities[0]
+
+
+class AdaptiveOrientationPredictor(OrientationPredictor):
+    def __init__(
+            self,
+            executor: Annotated[AbstractExecutor, Inject],
+            preprocessing_pipeline: Annotated[PreprocessingPipeline, Inject],
+            tta_config: Annotated[TestTimeAugmentationConfig, Inject]
+    ):
+        """
+        Runs the network on the image as it is first, and only runs it on the other three rotations (averaging the
+        results like :py:class:`OrientationPredictor` does) if the most likely orientation's probability is below the
+        threshold. Most photos are classified confidently, so this saves most of the computation.
+
+        The executor has to support batch sizes other than 4.
+
+        Parameters
+        ----------
+        executor
+            The executor that will run the network.
+        preprocessing_pipeline
+            The pipeline that converts images into input tensors.
+        tta_config
+            The test time augmentation configuration, which contains the threshold.
+        """
+        super().__init__(executor=executor, preprocessing_pipeline=preprocessing_pipeline)
+        self.threshold = tta_config.threshold
+
+    def infer(self, batched_arr: np.ndarray) -> np.ndarray:
+        # The first element of the batch is the image as it is
+        res = self.executor(batched_arr[:1])
+        probabilities = softmax(res)[0]
+        if np.max(probabilities) >= self.threshold:
+            self.tta_statistics.record(full=False)
+            return probabilities
+        res = np.concatenate([res, self.executor(batched_arr[1:])], axis=0)
+        self.tta_statistics.record(full=True)
+        return self.postprocess(res)
+
+
+PREDICTORS = {
+    GRAPH_STANDARD: OrientationPredictor,
+    GRAPH_END_TO_END: EndToEndOrientationPredictor,
+}
+
+
+def get_predictor_type(graph: str, tta_mode: str = TTA_FULL) -> type:
+    """
+    Returns the :py:class:`OrientationPredictor` implementation that corresponds to the values of
+    :py:attr:`~ori3nt8.gui.inference.executors.InferenceConfig.graph` and :py:attr:`TestTimeAugmentationConfig.mode`.
+    """
+    if graph not in PREDICTORS:
+        raise ValueError(f"Unknown graph: {graph}. Supported graphs: {', '.join(PREDICTORS)}")
+    if tta_mode == TTA_ADAPTIVE:
+        if graph != GRAPH_STANDARD:
+            raise ValueError(f"The {TTA_ADAPTIVE} test time augmentation mode requires the {GRAPH_STANDARD} graph")
+        return AdaptiveOrientationPredictor
+    if tta_mode != TTA_FULL:
+        raise ValueError(f"Unknown test time augmentation mode: {tta_mode}")
+    return PREDICTORS[graph]
@@ -0,0 +1,95 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import functools
+import hashlib
+import os
+from pathlib import Path
+
+import appdirs
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(str(path), "rb") as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_file_version(path: str, size: int, modification_time: int) -> str:
+    return hash_file(Path(path))
+
+
+def hash_model_file(path: Path) -> str:
+    """
+    Hashes the model file, reusing the hash computed earlier in this process unless the file has been modified since.
+    """
+    stat = os.stat(str(path))
+    return _hash_file_version(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+class PreparedModelCache():
+    def __init__(self, model_path: Path):
+        """
+        Stores the forms into which the executors convert the model (e.g. Caffe2 nets or a model optimized by ONNX
+        Runtime), so that the conversion only has to be performed once.
+
+        The prepared models are keyed by a hash of the model file and by the backend, its version and the options that
+        affect the conversion, and are stored in the user's cache directory.
+
+        Parameters
+        ----------
+        model_path
+            The path to the ONNX model.
+        """
+        self.model_path = model_path
+        self.directory = Path(appdirs.user_cache_dir("ori3nt8")) / "prepared_models"
+
+    def get_path(self, backend: str, backend_version: str, options: str, suffix: str) -> Path:
+        """
+        Returns the path at which the prepared model is (or should be) stored.
+
+        Parameters
+        ----------
+        backend
+            The name of the backend that has prepared the model.
+        backend_version
+            The version of the backend.
+        options
+            The options that affect the prepared model.
+        suffix
+            The suffix of the file, which distinguishes the files that make up a single prepared model.
+        """
+        key = f"{hash_model_file(self.model_path)}:{backend}:{backend_version}:{options}"
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}{suffix}"
+
+    def get_temporary_path(self, path: Path) -> Path:
+        """
+        Returns a path that the prepared model can be written to before being moved to the specified path using
+        :py:meth:`commit`, so that other processes never read a partially written file.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    def commit(self, temporary_path: Path, path: Path):
+        os.replace(str(temporary_path), str(path))
+
+    def write(self, path: Path, data: bytes):
+        temporary_path = self.get_temporary_path(path)
+        temporary_path.write_bytes(data)
+        self.commit(temporary_path, path)
@@ -12,14 +12,16 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from pathlib import Path
+
 import numpy as np
-from PIL import Image
-from PySide2.QtCore import Qt
-from PySide2.QtGui import QImage
+from PySide2.QtCore import Qt, QSize
+from PySide2.QtGui import QImage, QImageReader
 from grundzeug.container.di import Inject
 from typing_extensions import Annotated
 
 from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.utils.thumbnails import read_exif_thumbnail_image
 
 
 class PreprocessingPipeline():
@@ -28,11 +30,38 @@ class PreprocessingPipeline():
         self.crop_to = preprocessing_config.crop_to
         self.normalization_mean = np.array(preprocessing_config.normalization_mean).reshape((3, 1, 1))
         self.normalization_std = np.array(preprocessing_config.normalization_std).reshape((3, 1, 1))
+        self.thumbnail_min_size = preprocessing_config.thumbnail_min_size
+
+    def read_image(self, path: Path) -> QImage:
+        """
+        Decodes the image straight to the size produced by :py:meth:`resize_qimage`.
+
+        Unlike the full resolution decode used for display, this lets libjpeg downscale the image while decoding it
+        (using DCT scaling), so only a fraction of the pixels of a large photo are ever decoded. If the thumbnail
+        embedded into the image's EXIF metadata is at least `thumbnail_min_size` pixels in size, the thumbnail is
+        returned instead (at its own size), without decoding the image at all.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+
+        Returns
+        -------
+        The decoded image, or a null image if the file couldn't be read.
+        """
+        if self.thumbnail_min_size > 0:
+            thumbnail = read_exif_thumbnail_image(path)
+            if not thumbnail.isNull() and min(thumbnail.width(), thumbnail.height()) >= self.thumbnail_min_size:
+                return thumbnail
+        reader = QImageReader(str(path))
+        reader.setScaledSize(QSize(self.resize_to, self.resize_to))
+        return reader.read()
 
     def resize_qimage(self, image: QImage) -> QImage:
         return image.scaled(self.resize_to, self.resize_to, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
 
-    def qimage_to_numpy(self, image: QImage) -> Image:
+    def qimage_to_numpy(self, image: QImage) -> np.ndarray:
         image = image.convertToFormat(QImage.Format.Format_RGB32)
         width = image.width()
         height = image.height()
@@ -0,0 +1,219 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import ctypes
+import logging
+import multiprocessing
+import queue
+import sys
+from multiprocessing.connection import Connection
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PySide2.QtGui import QImage
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.common.containers import build_container
+from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.executors import AbstractExecutor, InferenceConfig, OnnxRuntimeConfig, get_executor_type
+from ori3nt8.gui.inference.prediction import OrientationPredictor, TestTimeAugmentationConfig, get_predictor_type
+from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
+
+logger = logging.getLogger(__name__)
+
+NUM_ORIENTATIONS = 4
+
+
+@configuration(["inference", "processes"])
+class InferenceProcessConfig():
+    workers: int = Configurable[int](
+        ["workers"],
+        default=0,
+        description="Number of child processes that preprocess the images and run the network, 0 to do this in the "
+                    "GUI process"
+    )
+
+
+def _serve(argv: List[str], input_buffer, output_buffer, connection: Connection):
+    """
+    The entry point of an inference process.
+
+    Builds the predictor from the same command line arguments as the GUI and then predicts the orientation of the
+    images placed into ``input_buffer`` until the connection is closed. Only the shapes of the images and the status
+    of each prediction (an error message, or whether the network had to be run on all four rotations of the image)
+    are sent over the connection; the pixels and the probabilities are exchanged through the shared buffers.
+    """
+    sys.argv = argv
+    try:
+        container = build_container(
+            [InferenceConfig, OnnxRuntimeConfig, PreprocessingConfig, TestTimeAugmentationConfig],
+            ignore_unknown_arguments=True
+        )
+        container.register_type[AbstractExecutor, get_executor_type(container.resolve[InferenceConfig.executor]())]()
+        container.register_type[PreprocessingPipeline]()
+        predictor_type = get_predictor_type(
+            container.resolve[InferenceConfig.graph](),
+            container.resolve[TestTimeAugmentationConfig.mode]()
+        )
+        predictor: OrientationPredictor = container.inject(predictor_type)()
+    except Exception as e:
+        logger.exception("Couldn't initialize the inference process")
+        connection.send(f"Couldn't initialize the inference process: {e!r}")
+        return
+    connection.send(None)
+
+    probabilities = np.frombuffer(output_buffer, dtype=np.float32)
+    while True:
+        try:
+            shape = connection.recv()
+        except EOFError:
+            return
+        try:
+            pixels = np.frombuffer(input_buffer, dtype=np.uint8, count=int(np.prod(shape))).reshape(shape)
+            full_predictions = predictor.tta_statistics.full_predictions
+            probabilities[:] = predictor.infer(predictor.prepare_pixels(pixels))
+        except Exception as e:
+            logger.exception("Couldn't predict the orientation of an image")
+            connection.send(repr(e))
+        else:
+            connection.send(predictor.tta_statistics.full_predictions > full_predictions)
+
+
+class _InferenceProcess():
+    def __init__(self, context, input_size: int):
+        """
+        A child process that runs :py:func:`_serve`, along with the shared buffers used to communicate with it.
+
+        Parameters
+        ----------
+        context
+            The multiprocessing context used to create the process and the buffers.
+        input_size
+            The size of the largest image that will be passed to the process, in bytes.
+        """
+        self.input_buffer = context.RawArray(ctypes.c_uint8, input_size)
+        self.output_buffer = context.RawArray(ctypes.c_float, NUM_ORIENTATIONS)
+        self.pixels = np.frombuffer(self.input_buffer, dtype=np.uint8)
+        self.probabilities = np.frombuffer(self.output_buffer, dtype=np.float32)
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_serve,
+            args=(sys.argv, self.input_buffer, self.output_buffer, child_connection),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.initialized = False
+        self.initialization_error: Optional[str] = None
+        # Set once the connection to the process is lost (e.g. because it has crashed)
+        self.dead = False
+
+    def _receive(self):
+        try:
+            status = self.connection.recv()
+        except (EOFError, OSError):
+            self.dead = True
+            raise RuntimeError(f"The inference process exited with code {self.process.exitcode}")
+        if isinstance(status, str):
+            raise RuntimeError(status)
+        return status
+
+    def __call__(self, pixels: np.ndarray) -> Tuple[np.ndarray, bool]:
+        """
+        Returns the probabilities and whether the network had to be run on all four rotations of the image.
+        """
+        if self.initialization_error is not None:
+            raise RuntimeError(self.initialization_error)
+        if not self.initialized:
+            try:
+                self._receive()
+            except RuntimeError as e:
+                if not self.dead:
+                    # The process couldn't load the model and has exited, so there's no point in replacing it
+                    self.initialization_error = str(e)
+                raise
+            self.initialized = True
+        shape: Tuple[int, ...] = pixels.shape
+        np.copyto(self.pixels[:pixels.size].reshape(shape), pixels)
+        try:
+            self.connection.send(shape)
+        except OSError:
+            self.dead = True
+            raise RuntimeError(f"The inference process exited with code {self.process.exitcode}")
+        full = self._receive()
+        return self.probabilities.copy(), full
+
+    def close(self):
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ProcessPoolOrientationPredictor(OrientationPredictor):
+    def __init__(
+            self,
+            preprocessing_pipeline: Annotated[PreprocessingPipeline, Inject],
+            inference_process_config: Annotated[InferenceProcessConfig, Inject]
+    ):
+        """
+        Predicts orientations in child processes, which perform the NumPy preprocessing and run the network, so that
+        the Python-level work involved doesn't compete with the GUI thread for the GIL.
+
+        :py:meth:`prepare` only resizes the image (which Qt does without holding the GIL). The resized pixels are
+        copied into a buffer shared with an idle process, which performs the rest of the prediction and writes the
+        probabilities into another shared buffer, so no arrays are pickled. The processes load the model as soon as
+        the predictor is created, each using the same command line arguments as the GUI, and are terminated when the
+        GUI exits. A process that exits unexpectedly is replaced by a new one.
+
+        Parameters
+        ----------
+        preprocessing_pipeline
+            The pipeline that resizes the images.
+        inference_process_config
+            The inference process configuration.
+        """
+        super().__init__(executor=None, preprocessing_pipeline=preprocessing_pipeline)
+        if inference_process_config.workers <= 0:
+            raise ValueError("At least one inference process is required")
+        self._context = multiprocessing.get_context("spawn")
+        self._input_size = preprocessing_pipeline.resize_to * preprocessing_pipeline.resize_to * 3
+        self._idle_processes: "queue.Queue[_InferenceProcess]" = queue.Queue()
+        for _ in range(inference_process_config.workers):
+            self._idle_processes.put(_InferenceProcess(self._context, self._input_size))
+
+    def prepare(self, image: QImage) -> np.ndarray:
+        """
+        Resizes the image and returns its pixels, which should be passed into :py:meth:`infer`.
+        """
+        image = self.preprocessing_pipeline.resize_qimage(image)
+        return self.preprocessing_pipeline.qimage_to_numpy(image)
+
+    def infer(self, pixels: np.ndarray) -> np.ndarray:
+        """
+        Waits for an idle process and predicts the orientation of the image with the pixels produced by
+        :py:meth:`prepare` in it.
+        """
+        process = self._idle_processes.get()
+        try:
+            probabilities, full = process(pixels)
+        finally:
+            if process.dead:
+                logger.warning("An inference process has exited unexpectedly, starting a new one")
+                process.close()
+                process = _InferenceProcess(self._context, self._input_size)
+            self._idle_processes.put(process)
+        self.tta_statistics.record(full)
+        return probabilities
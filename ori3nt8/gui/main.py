@@ -12,40 +12,70 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import multiprocessing
 import sys
-from typing import Tuple
 
 from PySide2.QtWidgets import QApplication
-from grundzeug.container import Container
-from grundzeug.container.plugins import ContainerConverterResolutionPlugin, ContainerConfigurationResolutionPlugin
-from grundzeug.converters import Converter
 
-from ori3nt8.gui.inference.executors import AbstractExecutor, Caffe2Executor
+from ori3nt8.common.containers import build_container
+from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.batching import BatchingExecutor, BatchingConfig, BACKEND_EXECUTOR_BEAN_NAME
+from ori3nt8.gui.inference.cache import PredictionCache
+from ori3nt8.gui.inference.executors import AbstractExecutor, InferenceConfig, OnnxRuntimeConfig, get_executor_type
+from ori3nt8.gui.inference.prediction import OrientationPredictor, TestTimeAugmentationConfig, get_predictor_type
+from ori3nt8.gui.inference.processes import InferenceProcessConfig, ProcessPoolOrientationPredictor
 from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
-from ori3nt8.gui.metadata.common import AbstractMetadataStorage
-from ori3nt8.gui.metadata.sql import SqliteMetadataStorage
-from ori3nt8.gui.runnables.workers import ImageWorkers
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage, MetadataConfig, get_metadata_storage_type
+from ori3nt8.gui.metadata.write_behind import WriteBehindMetadataStorage, WriteBehindConfig, BACKING_STORAGE_BEAN_NAME
+from ori3nt8.gui.runnables.analysis import DirectoryAnalysisConfig
+from ori3nt8.gui.runnables.workers import ImageWorkers, PrefetchConfig
+from ori3nt8.gui.utils.image_cache import ImageCacheConfig
 from ori3nt8.gui.utils.ui_file import compile_ui_files
 from ori3nt8.utils.resources import running_in_pyinstaller
 
 if __name__ == "__main__":
+    # The inference processes are started using the spawn method, which re-runs this module in a frozen application
+    multiprocessing.freeze_support()
     if not running_in_pyinstaller():
         compile_ui_files()
     app = QApplication(sys.argv)
 
     from ori3nt8.gui.MainWindow import MainWindow
 
-    container = Container()
+    container = build_container(
+        [
+            InferenceConfig,
+            OnnxRuntimeConfig,
+            InferenceProcessConfig,
+            TestTimeAugmentationConfig,
+            BatchingConfig,
+            PreprocessingConfig,
+            MetadataConfig,
+            WriteBehindConfig,
+            ImageCacheConfig,
+            PrefetchConfig,
+            DirectoryAnalysisConfig
+        ],
+        ignore_unknown_arguments=True
+    )
 
-    container.add_plugin(ContainerConverterResolutionPlugin())
-    container.register_instance[Converter[list, Tuple[float, float, float]]](tuple)
-    config_plugin = ContainerConfigurationResolutionPlugin()
-    container.add_plugin(config_plugin)
-
-    container.register_type[AbstractExecutor, Caffe2Executor]()
-    container.register_type[AbstractMetadataStorage, SqliteMetadataStorage]()
+    executor_type = get_executor_type(container.resolve[InferenceConfig.executor]())
+    container.register_type[AbstractExecutor, executor_type](bean_name=BACKEND_EXECUTOR_BEAN_NAME)
+    container.register_type[AbstractExecutor, BatchingExecutor]()
+    storage_type = get_metadata_storage_type(container.resolve[MetadataConfig.storage]())
+    container.register_type[AbstractMetadataStorage, storage_type](bean_name=BACKING_STORAGE_BEAN_NAME)
+    container.register_type[AbstractMetadataStorage, WriteBehindMetadataStorage]()
     container.register_type[ImageWorkers]()
     container.register_type[PreprocessingPipeline]()
+    container.register_type[PredictionCache]()
+    if container.resolve[InferenceProcessConfig.workers]() > 0:
+        container.register_type[OrientationPredictor, ProcessPoolOrientationPredictor]()
+    else:
+        predictor_type = get_predictor_type(
+            container.resolve[InferenceConfig.graph](),
+            container.resolve[TestTimeAugmentationConfig.mode]()
+        )
+        container.register_type[OrientationPredictor, predictor_type]()
     window = container.inject(MainWindow)()
     window.show()
 
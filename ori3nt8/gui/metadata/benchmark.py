@@ -0,0 +1,110 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from grundzeug.config import configuration, Configurable
+
+from ori3nt8.common.containers import build_container
+from ori3nt8.gui.metadata.common import Metadata, get_metadata_storage_type, STORAGE_SQLITE3, STORAGE_SQLALCHEMY, \
+    AbstractMetadataStorage
+
+BENCHMARK_DIRECTORY = Path("/benchmark")
+
+
+@configuration(["metadata", "benchmark"])
+class MetadataBenchmarkConfig():
+    storages: str = Configurable[str](
+        ["storages"],
+        default=f"{STORAGE_SQLITE3},{STORAGE_SQLALCHEMY}",
+        description="Comma-separated list of the metadata storages to benchmark"
+    )
+    images: int = Configurable[int](
+        ["images"],
+        default=2000,
+        description="Number of images whose metadata is written and read"
+    )
+    batch_size: int = Configurable[int](
+        ["batch_size"],
+        default=200,
+        description="Number of images written by each dump_many call"
+    )
+
+
+def measure_throughput(operation: Callable[[], None], operations: int) -> float:
+    """
+    Runs the operation once and returns the number of operations that it performed per second.
+    """
+    start_time = time.perf_counter()
+    operation()
+    return operations / (time.perf_counter() - start_time)
+
+
+def benchmark_storage(storage: AbstractMetadataStorage, images: int, batch_size: int) -> Dict[str, float]:
+    """
+    Measures the throughput of the storage, in images per second.
+
+    The storage should be empty, since the first benchmark measures inserts and the second one updates.
+    """
+    paths = [BENCHMARK_DIRECTORY / f"{i // 100}" / f"{i}.jpg" for i in range(images)]
+    batches = [
+        {path: Metadata(original_orientation=i % 4, suggested_orientation=(i + 1) % 4) for i, path in enumerate(chunk)}
+        for chunk in (paths[start:start + batch_size] for start in range(0, images, batch_size))
+    ]
+
+    def dump():
+        for i, path in enumerate(paths):
+            storage.dump(path, Metadata(original_orientation=i % 4))
+
+    def dump_many():
+        for batch in batches:
+            storage.dump_many(batch)
+
+    def load():
+        for path in paths:
+            storage.load(path)
+
+    return {
+        "dump": measure_throughput(dump, images),
+        "dump_many": measure_throughput(dump_many, images),
+        "load": measure_throughput(load, images),
+        "load_directory": measure_throughput(lambda: storage.load_directory(BENCHMARK_DIRECTORY), images),
+    }
+
+
+def main() -> None:
+    container = build_container([MetadataBenchmarkConfig])
+    benchmark_config: MetadataBenchmarkConfig = container.resolve[MetadataBenchmarkConfig]()
+
+    print(f"{'storage':<16}{'dump/s':>14}{'dump_many/s':>14}{'load/s':>14}{'load_directory/s':>18}")
+    for storage_name in benchmark_config.storages.split(","):
+        storage_name = storage_name.strip()
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            storage = get_metadata_storage_type(storage_name)(database_path=Path(temporary_directory) / "metadata.db")
+            results = benchmark_storage(storage, benchmark_config.images, benchmark_config.batch_size)
+            del storage
+        print(
+            f"{storage_name:<16}"
+            f"{results['dump']:>14.0f}"
+            f"{results['dump_many']:>14.0f}"
+            f"{results['load']:>14.0f}"
+            f"{results['load_directory']:>18.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,26 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import os
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Mapping, Tuple, Type, Dict
+
+import appdirs
+from grundzeug.config import configuration, Configurable
+
+STORAGE_SQLITE3 = "sqlite3"
+STORAGE_SQLALCHEMY = "sqlalchemy"
+
+
+@configuration(["metadata"])
+class MetadataConfig():
+    storage: str = Configurable[str](
+        ["storage"],
+        default=STORAGE_SQLITE3,
+        description=f"The metadata storage engine, either {STORAGE_SQLITE3} or {STORAGE_SQLALCHEMY}"
+    )
 
 
 @dataclass
@@ -34,3 +50,51 @@ class AbstractMetadataStorage(ABC):
     @abstractmethod
     def load(self, path: Path) -> Metadata:
         raise NotImplementedError()
+
+    def dump_many(self, metadata_by_path: Mapping[Path, Metadata]):
+        for path, metadata in metadata_by_path.items():
+            self.dump(path, metadata)
+
+    @abstractmethod
+    def load_directory(self, directory: Path) -> Dict[Path, Metadata]:
+        """
+        Loads the metadata of all images in the directory and its subdirectories that have metadata stored, keyed by
+        their paths.
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        pass
+
+    def preload(self, directory: Path):
+        """
+        Loads the metadata of all images under the directory in advance, so that :py:meth:`load` doesn't have to query
+        the storage for each of them.
+        """
+        pass
+
+
+def get_metadata_storage_type(name: str) -> Type[AbstractMetadataStorage]:
+    if name == STORAGE_SQLITE3:
+        from ori3nt8.gui.metadata.sqlite import Sqlite3MetadataStorage
+        return Sqlite3MetadataStorage
+    if name == STORAGE_SQLALCHEMY:
+        # Imported lazily, since importing SQLAlchemy noticeably slows down the startup
+        from ori3nt8.gui.metadata.sql import SqliteMetadataStorage
+        return SqliteMetadataStorage
+    raise ValueError(f"Unknown metadata storage: {name}")
+
+
+def default_database_path() -> Path:
+    database_path = Path(appdirs.user_data_dir("ori3nt8")) / "metadata.db"
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    return database_path
+
+
+def path_prefix_range(directory: Path) -> Tuple[str, str]:
+    """
+    Returns the bounds of the half-open range that contains exactly the paths under the directory.
+    """
+    prefix = os.path.join(str(directory), "")
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return prefix, upper_bound
@@ -12,19 +12,21 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import sqlite3
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Mapping, Dict, Tuple
 
-import appdirs
-from sqlalchemy import Column, Integer, Text, SmallInteger, Boolean, create_engine
+from sqlalchemy import Column, Integer, Text, SmallInteger, Boolean, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 
-from ori3nt8.gui.metadata.common import Metadata, AbstractMetadataStorage
+from ori3nt8.gui.metadata.common import Metadata, AbstractMetadataStorage, default_database_path, path_prefix_range
 
 Base = declarative_base()
 
+# The number of paths that are looked up using a single query, which keeps the number of bound parameters well below
+# SQLite's limit.
+_QUERY_CHUNK_SIZE = 500
+
 
 class MetadataTable(Base):
     __tablename__ = "metadata"
@@ -36,18 +38,61 @@ class MetadataTable(Base):
     orientation_was_selected_automatically = Column(Boolean)
 
 
+def _configure_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # In WAL mode, NORMAL only syncs at checkpoints, so a commit doesn't wait for the disk. The database stays
+    # consistent, although the latest commits may be lost on power failure.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 class SqliteMetadataStorage(AbstractMetadataStorage):
-    def __init__(self):
-        database_path = Path(appdirs.user_data_dir("ori3nt8")) / "metadata.db"
-        database_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(database_path))
+    def __init__(self, database_path: Optional[Path] = None):
+        if database_path is None:
+            database_path = default_database_path()
         engine = create_engine(f"sqlite:///{str(database_path)}", echo=False)
+        event.listen(engine, "connect", _configure_connection)
         Base.metadata.create_all(engine)
         Session = sessionmaker(bind=engine)
-        self.session = Session()
+        # Writes may come from a background thread, so every thread gets its own session
+        self.session = scoped_session(Session)
+        # The path prefix of the preloaded directory and the metadata of the images under it, keyed by their paths.
+        self._preloaded: Tuple[Optional[str], Dict[str, Metadata]] = (None, {})
 
     def dump(self, path: Path, metadata: Metadata):
         entity = self.session.query(MetadataTable).filter_by(path=str(path)).first()
+        entity = self._update_entity(entity, path, metadata)
+        self.session.commit()
+        self._update_preloaded({path: metadata})
+        return entity
+
+    def dump_many(self, metadata_by_path: Mapping[Path, Metadata]):
+        items = list(metadata_by_path.items())
+        try:
+            for start in range(0, len(items), _QUERY_CHUNK_SIZE):
+                chunk = items[start:start + _QUERY_CHUNK_SIZE]
+                entities = self.session.query(MetadataTable) \
+                    .filter(MetadataTable.path.in_([str(path) for path, _ in chunk])) \
+                    .all()
+                entities_by_path = {entity.path: entity for entity in entities}
+                for path, metadata in chunk:
+                    self._update_entity(entities_by_path.get(str(path)), path, metadata)
+            self.session.commit()
+        except:
+            self.session.rollback()
+            raise
+        self._update_preloaded(metadata_by_path)
+
+    def _update_preloaded(self, metadata_by_path: Mapping[Path, Metadata]):
+        prefix, preloaded = self._preloaded
+        if prefix is None:
+            return
+        for path, metadata in metadata_by_path.items():
+            if str(path).startswith(prefix):
+                preloaded[str(path)] = metadata
+
+    def _update_entity(self, entity: Optional[MetadataTable], path: Path, metadata: Metadata) -> MetadataTable:
         if not entity:
             entity = MetadataTable(
                 path=str(path),
@@ -62,10 +107,13 @@ class SqliteMetadataStorage(AbstractMetadataStorage):
             entity.suggested_orientation = metadata.suggested_orientation
             entity.orientation_was_selected_manually = metadata.orientation_was_selected_manually
             entity.orientation_was_selected_automatically = metadata.orientation_was_selected_automatically
-        self.session.commit()
         return entity
 
     def load(self, path: Path) -> Optional[Metadata]:
+        prefix, preloaded = self._preloaded
+        if prefix is not None and str(path).startswith(prefix):
+            return preloaded.get(str(path))
+
         entity = self.session.query(MetadataTable).filter_by(path=str(path)).first()
         if not entity:
             return None
@@ -76,3 +124,46 @@ class SqliteMetadataStorage(AbstractMetadataStorage):
             orientation_was_selected_manually=entity.orientation_was_selected_manually,
             orientation_was_selected_automatically=entity.orientation_was_selected_automatically,
         )
+
+    def load_directory(self, directory: Path) -> Dict[Path, Metadata]:
+        """
+        Loads the metadata of all images in the directory and its subdirectories.
+
+        Since the paths are absolute, the images under a directory form a contiguous range of paths, which is
+        retrieved using a single range query over the index on the path column.
+
+        Parameters
+        ----------
+        directory
+            The absolute path to the directory.
+
+        Returns
+        -------
+        The metadata of the images, keyed by their paths.
+        """
+        return {Path(path): metadata for path, metadata in self._load_directory(directory).items()}
+
+    def _load_directory(self, directory: Path) -> Dict[str, Metadata]:
+        prefix, upper_bound = path_prefix_range(directory)
+        rows = self.session.query(
+            MetadataTable.path,
+            MetadataTable.original_orientation,
+            MetadataTable.suggested_orientation,
+            MetadataTable.orientation_was_selected_manually,
+            MetadataTable.orientation_was_selected_automatically
+        ).filter(MetadataTable.path >= prefix, MetadataTable.path < upper_bound).all()
+        self.session.commit()
+        return {
+            row.path: Metadata(
+                original_orientation=row.original_orientation,
+                suggested_orientation=row.suggested_orientation,
+                orientation_was_selected_manually=row.orientation_was_selected_manually,
+                orientation_was_selected_automatically=row.orientation_was_selected_automatically,
+            )
+            for row in rows
+        }
+
+    def preload(self, directory: Path):
+        prefix, _ = path_prefix_range(directory)
+        self._preloaded = (prefix, self._load_directory(directory))
+
@@ -0,0 +1,162 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Mapping, Dict, Tuple
+
+from ori3nt8.gui.metadata.common import Metadata, AbstractMetadataStorage, default_database_path, path_prefix_range
+
+# The schema matches the one created by SqliteMetadataStorage, so both storages can use the same database.
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS metadata (
+    id INTEGER NOT NULL PRIMARY KEY,
+    path TEXT UNIQUE,
+    original_orientation SMALLINT,
+    suggested_orientation SMALLINT,
+    orientation_was_selected_manually BOOLEAN,
+    orientation_was_selected_automatically BOOLEAN
+)
+"""
+
+_UPSERT = """
+INSERT INTO metadata (
+    path,
+    original_orientation,
+    suggested_orientation,
+    orientation_was_selected_manually,
+    orientation_was_selected_automatically
+) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET
+    original_orientation = excluded.original_orientation,
+    suggested_orientation = excluded.suggested_orientation,
+    orientation_was_selected_manually = excluded.orientation_was_selected_manually,
+    orientation_was_selected_automatically = excluded.orientation_was_selected_automatically
+"""
+
+_COLUMNS = """
+original_orientation,
+suggested_orientation,
+orientation_was_selected_manually,
+orientation_was_selected_automatically
+"""
+
+_SELECT = f"SELECT {_COLUMNS} FROM metadata WHERE path = ?"
+
+_SELECT_RANGE = f"SELECT path, {_COLUMNS} FROM metadata WHERE path >= ? AND path < ?"
+
+
+def _to_row(path: Path, metadata: Metadata) -> Tuple[str, int, Optional[int], bool, bool]:
+    return (
+        str(path),
+        metadata.original_orientation,
+        metadata.suggested_orientation,
+        bool(metadata.orientation_was_selected_manually),
+        bool(metadata.orientation_was_selected_automatically),
+    )
+
+
+def _from_row(original_orientation, suggested_orientation, selected_manually, selected_automatically) -> Metadata:
+    return Metadata(
+        original_orientation=original_orientation,
+        suggested_orientation=suggested_orientation,
+        orientation_was_selected_manually=bool(selected_manually),
+        orientation_was_selected_automatically=bool(selected_automatically),
+    )
+
+
+class Sqlite3MetadataStorage(AbstractMetadataStorage):
+    def __init__(self, database_path: Optional[Path] = None):
+        """
+        Stores the metadata in an SQLite database using the sqlite3 module directly.
+
+        Every statement is a single prepared statement (the sqlite3 module caches them per connection), and updates are
+        performed using upserts, which requires SQLite 3.24 or later. Each thread gets its own connection, so that
+        loads from the GUI thread don't wait for a background thread's writes.
+
+        Parameters
+        ----------
+        database_path
+            The path to the database, by default `metadata.db` in the user's data directory.
+        """
+        if database_path is None:
+            database_path = default_database_path()
+        self.database_path = database_path
+        self._local = threading.local()
+        # The path prefix of the preloaded directory and the metadata of the images under it, keyed by their paths.
+        self._preloaded: Tuple[Optional[str], Dict[str, Metadata]] = (None, {})
+        with self._connection() as conn:
+            conn.execute(_CREATE_TABLE)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.database_path))
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def dump(self, path: Path, metadata: Metadata):
+        with self._connection() as conn:
+            conn.execute(_UPSERT, _to_row(path, metadata))
+        self._update_preloaded({path: metadata})
+
+    def dump_many(self, metadata_by_path: Mapping[Path, Metadata]):
+        with self._connection() as conn:
+            conn.executemany(_UPSERT, [_to_row(path, metadata) for path, metadata in metadata_by_path.items()])
+        self._update_preloaded(metadata_by_path)
+
+    def _update_preloaded(self, metadata_by_path: Mapping[Path, Metadata]):
+        prefix, preloaded = self._preloaded
+        if prefix is None:
+            return
+        for path, metadata in metadata_by_path.items():
+            if str(path).startswith(prefix):
+                preloaded[str(path)] = metadata
+
+    def load(self, path: Path) -> Optional[Metadata]:
+        prefix, preloaded = self._preloaded
+        if prefix is not None and str(path).startswith(prefix):
+            return preloaded.get(str(path))
+
+        row = self._connection().execute(_SELECT, (str(path),)).fetchone()
+        if row is None:
+            return None
+        return _from_row(*row)
+
+    def load_directory(self, directory: Path) -> Dict[Path, Metadata]:
+        """
+        Loads the metadata of all images in the directory and its subdirectories using a single range query over the
+        index on the path column.
+
+        Parameters
+        ----------
+        directory
+            The absolute path to the directory.
+
+        Returns
+        -------
+        The metadata of the images, keyed by their paths.
+        """
+        return {Path(path): metadata for path, metadata in self._load_directory(directory).items()}
+
+    def _load_directory(self, directory: Path) -> Dict[str, Metadata]:
+        rows = self._connection().execute(_SELECT_RANGE, path_prefix_range(directory))
+        return {path: _from_row(*columns) for path, *columns in rows}
+
+    def preload(self, directory: Path):
+        prefix, _ = path_prefix_range(directory)
+        self._preloaded = (prefix, self._load_directory(directory))
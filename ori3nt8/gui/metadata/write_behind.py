@@ -0,0 +1,128 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from grundzeug.config import configuration, Configurable
+from grundzeug.container.di import Inject, InjectAnnotation
+from typing_extensions import Annotated
+
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage, Metadata
+
+logger = logging.getLogger(__name__)
+
+# The name of the bean that holds the storage wrapped by WriteBehindMetadataStorage.
+BACKING_STORAGE_BEAN_NAME = "backing"
+
+
+@configuration(["metadata", "write_behind"])
+class WriteBehindConfig():
+    flush_interval_ms: float = Configurable[float](
+        ["flush_interval_ms"],
+        default=200.0,
+        description="Number of milliseconds to collect metadata changes for before writing them in a single transaction"
+    )
+
+
+class WriteBehindMetadataStorage(AbstractMetadataStorage):
+    def __init__(
+            self,
+            storage: Annotated[
+                AbstractMetadataStorage,
+                InjectAnnotation[AbstractMetadataStorage].named(BACKING_STORAGE_BEAN_NAME)
+            ],
+            write_behind_config: Annotated[WriteBehindConfig, Inject]
+    ):
+        """
+        Writes metadata into the backing storage on a background thread, so that the callers never wait for the disk.
+
+        The changes made during `flush_interval_ms` milliseconds after the first unwritten change are written using a
+        single call to :py:meth:`AbstractMetadataStorage.dump_many`. Until they have been written, :py:meth:`load`
+        returns them from memory, so the callers always see their own changes.
+
+        Parameters
+        ----------
+        storage
+            The storage that the changes will be written into.
+        write_behind_config
+            The interval between writes.
+        """
+        self.storage: AbstractMetadataStorage = storage
+        self.flush_interval = write_behind_config.flush_interval_ms / 1000
+        self._condition = threading.Condition()
+        self._pending: Dict[Path, Metadata] = {}
+        self._flush_requested = False
+        self._thread = threading.Thread(target=self._run, name="metadata-writer", daemon=True)
+        self._thread.start()
+
+    def dump(self, path: Path, metadata: Metadata):
+        with self._condition:
+            self._pending[Path(path)] = metadata
+            self._condition.notify_all()
+
+    def load(self, path: Path) -> Optional[Metadata]:
+        with self._condition:
+            metadata = self._pending.get(Path(path))
+        if metadata is not None:
+            return metadata
+        return self.storage.load(path)
+
+    def load_directory(self, directory: Path) -> Dict[Path, Metadata]:
+        metadata_by_path = self.storage.load_directory(directory)
+        with self._condition:
+            metadata_by_path.update({
+                path: metadata
+                for path, metadata in self._pending.items()
+                if directory in path.parents
+            })
+        return metadata_by_path
+
+    def flush(self):
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: not self._pending)
+            self._flush_requested = False
+        self.storage.flush()
+
+    def preload(self, directory: Path):
+        self.storage.preload(directory)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                deadline = time.monotonic() + self.flush_interval
+                while not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                # The entries stay in the pending map until they've been written, so that they can still be loaded
+                batch = dict(self._pending)
+
+            try:
+                self.storage.dump_many(batch)
+            except Exception:
+                logger.exception(f"Couldn't write the metadata of {len(batch)} images")
+
+            with self._condition:
+                for path, metadata in batch.items():
+                    if self._pending.get(path) is metadata:
+                        del self._pending[path]
+                self._condition.notify_all()
@@ -13,25 +13,27 @@
 #  limitations under the License.
 
 from pathlib import Path
-from typing import Callable
 
-from PySide2.QtCore import QRunnable, Slot, QObject, Signal
+from PySide2.QtCore import QObject, Signal
 from PySide2.QtGui import QImageReader, QImage
 
+from ori3nt8.gui.utils.concurrency import CancellableRunnable
 
-class ImageReaderRunnable(QRunnable):
-    def __init__(self, path: Path, remove_runnable_callback: Callable[[], None]):
+
+class ImageReaderRunnable(CancellableRunnable):
+    def __init__(self, path: Path):
         super().__init__()
-        self.remove_runnable_callback = remove_runnable_callback
         self.path = path
         self.signals = ImageReaderRunnableSignals()
 
-    @Slot()
-    def run(self):
+    def process(self):
+        if self.cancellation_token.cancelled:
+            self.signals.processing_canceled.emit(str(self.path))
+            return
         image = QImageReader(str(self.path)).read()
-        self.remove_runnable_callback()
         self.signals.processing_completed.emit(image, str(self.path))
 
 
 class ImageReaderRunnableSignals(QObject):
     processing_completed = Signal(QImage, str)
+    processing_canceled = Signal(str)
@@ -0,0 +1,51 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from PySide2.QtCore import QObject, Signal, QSize, Qt
+from PySide2.QtGui import QImage
+
+from ori3nt8.gui.utils.concurrency import CancellableRunnable
+
+
+class ImageScalingRunnable(CancellableRunnable):
+    def __init__(self, image: QImage, size: QSize, key: object):
+        """
+        Scales an image down to fit into the specified size, preserving its aspect ratio.
+
+        Parameters
+        ----------
+        image
+            The image to scale.
+        size
+            The size of the box that the image should fit into, in device pixels.
+        key
+            An arbitrary value that is emitted along with the scaled image, identifying the request.
+        """
+        super().__init__()
+        self.image = image
+        self.size = size
+        self.key = key
+        self.signals = ImageScalingRunnableSignals()
+
+    def process(self):
+        if self.cancellation_token.cancelled:
+            return
+        image = self.image.scaled(self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if self.cancellation_token.cancelled:
+            return
+        self.signals.processing_completed.emit(image, self.key)
+
+
+class ImageScalingRunnableSignals(QObject):
+    processing_completed = Signal(QImage, object)
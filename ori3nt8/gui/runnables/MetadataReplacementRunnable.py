@@ -12,33 +12,53 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import logging
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
 from PySide2.QtCore import QRunnable, Slot
 
-from ori3nt8.utils.metadata import replace_exif_orientation
+from ori3nt8.utils.metadata import replace_exif_orientation, load_exif_data
+
+logger = logging.getLogger(__name__)
 
 
 class MetadataReplacementRunnable(QRunnable):
     def __init__(
             self,
-            path: Path,
-            orientation: int,
-            flip: int,
-            remove_runnable_callback: Callable[[], None]
+            next_write_callback: Callable[[], Optional[Tuple[Path, int, int]]],
+            write_completed_callback: Callable[[Path], None]
     ):
+        """
+        Writes orientation changes into images until there are no more changes to write.
+
+        Parameters
+        ----------
+        next_write_callback
+            Returns the path, orientation and flip value of the next image to write, or None if there are none left.
+        write_completed_callback
+            Called with the path to the image after each write, regardless of whether it succeeded.
+        """
         super().__init__()
-        self.remove_runnable_callback = remove_runnable_callback
-        self.path = path
-        self.orientation = orientation
-        self.flip = flip
+        self.next_write_callback = next_write_callback
+        self.write_completed_callback = write_completed_callback
 
     @Slot()
     def run(self):
-        replace_exif_orientation(
-            self.path,
-            orientation=self.orientation,
-            flip=self.flip
-        )
-        self.remove_runnable_callback()
+        while True:
+            write = self.next_write_callback()
+            if write is None:
+                return
+            path, orientation, flip = write
+            try:
+                # Rewriting the file is pointless if it already has the requested orientation
+                if load_exif_data(path) != (orientation, flip):
+                    replace_exif_orientation(
+                        path,
+                        orientation=orientation,
+                        flip=flip
+                    )
+            except Exception:
+                logger.exception(f"Couldn't write the orientation of {path}")
+            finally:
+                self.write_completed_callback(path)
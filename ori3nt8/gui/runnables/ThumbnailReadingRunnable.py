@@ -0,0 +1,51 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from pathlib import Path
+
+from PySide2.QtCore import QObject, Signal
+from PySide2.QtGui import QImage
+
+from ori3nt8.gui.utils.concurrency import CancellableRunnable
+from ori3nt8.gui.utils.thumbnails import read_exif_thumbnail_image
+from ori3nt8.utils.metadata import load_exif_data
+
+
+class ThumbnailReadingRunnable(CancellableRunnable):
+    def __init__(self, path: Path):
+        """
+        Reads the thumbnail embedded into the image's EXIF metadata, along with the image's EXIF orientation. Only the
+        headers of the image are read.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+        """
+        super().__init__()
+        self.path = path
+        self.signals = ThumbnailReadingRunnableSignals()
+
+    def process(self):
+        if self.cancellation_token.cancelled:
+            return
+        thumbnail = read_exif_thumbnail_image(self.path)
+        if thumbnail.isNull() or self.cancellation_token.cancelled:
+            return
+        orientation, _ = load_exif_data(self.path)
+        self.signals.processing_completed.emit(thumbnail, orientation, str(self.path))
+
+
+class ThumbnailReadingRunnableSignals(QObject):
+    processing_completed = Signal(QImage, int, str)
@@ -0,0 +1,238 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import dataclasses
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from PySide2.QtCore import QObject, QThreadPool, Signal
+from grundzeug.config import configuration, Configurable
+from grundzeug.container import Injector
+from grundzeug.container.di import Inject
+from typing_extensions import Annotated
+
+from ori3nt8.gui.inference.cache import PredictionCache
+from ori3nt8.gui.inference.prediction import OrientationPredictor
+from ori3nt8.gui.metadata.common import AbstractMetadataStorage, Metadata
+from ori3nt8.gui.utils.concurrency import CancellableRunnable, CancellationToken, SingleRunnableManager
+from ori3nt8.utils.jpeg import iter_jpeg_files
+from ori3nt8.utils.metadata import load_exif_data
+
+logger = logging.getLogger(__name__)
+
+
+@configuration(["gui", "analysis"])
+class DirectoryAnalysisConfig():
+    idle_ms: int = Configurable[int](
+        ["idle_ms"],
+        default=1500,
+        description="Time since the user last navigated to an image after which the background analysis of the opened "
+                    "directory resumes, in milliseconds"
+    )
+
+
+class DirectoryAnalysisRunnableSignals(QObject):
+    # The generation of the analysis, the number of images analysed so far, the total number of images and the fraction
+    # of the predictions that needed all four rotations.
+    progress_changed = Signal(int, int, int, float)
+
+
+class DirectoryAnalysisRunnable(CancellableRunnable):
+    def __init__(
+            self,
+            directory: Path,
+            generation: int,
+            wait_for_idle_callback: Callable[[CancellationToken], bool],
+            is_shown_callback: Callable[[Path], bool],
+            orientation_predictor: Annotated[OrientationPredictor, Inject],
+            prediction_cache: Annotated[PredictionCache, Inject],
+            metadata_storage_engine: Annotated[AbstractMetadataStorage, Inject]
+    ):
+        """
+        Predicts the orientation of every image in a directory, storing the suggestions in the metadata storage.
+
+        Parameters
+        ----------
+        directory
+            The directory to analyse.
+        generation
+            The generation of the analysis, which identifies it in the progress signals.
+        wait_for_idle_callback
+            Called with the cancellation token before each image is analysed. Blocks while the user is busy and
+            returns False if the analysis has been canceled.
+        is_shown_callback
+            Returns True if the user is looking at the image, in which case its suggestion is computed separately.
+        """
+        super().__init__()
+        self.directory = directory
+        self.generation = generation
+        self.wait_for_idle_callback = wait_for_idle_callback
+        self.is_shown_callback = is_shown_callback
+        self.signals = DirectoryAnalysisRunnableSignals()
+        self.orientation_predictor: OrientationPredictor = orientation_predictor
+        self.prediction_cache: PredictionCache = prediction_cache
+        self.metadata_storage_engine: AbstractMetadataStorage = metadata_storage_engine
+
+    def process(self):
+        paths = list(iter_jpeg_files(self.directory))
+        self.signals.progress_changed.emit(self.generation, 0, len(paths), self._full_tta_fraction())
+        for analysed, path in enumerate(paths, start=1):
+            if not self.wait_for_idle_callback(self.cancellation_token):
+                return
+            try:
+                if not self.is_shown_callback(path):
+                    self._analyse(path)
+            except Exception:
+                logger.exception(f"Couldn't analyse {path}")
+            self.signals.progress_changed.emit(self.generation, analysed, len(paths), self._full_tta_fraction())
+
+    def _full_tta_fraction(self) -> float:
+        return self.orientation_predictor.tta_statistics.full_fraction
+
+    def _analyse(self, path: Path):
+        metadata = self.metadata_storage_engine.load(path)
+        if metadata is not None and metadata.suggested_orientation is not None:
+            return
+
+        probabilities = self.prediction_cache.load(path)
+        if probabilities is None:
+            image = self.orientation_predictor.preprocessing_pipeline.read_image(str(path))
+            if image.isNull():
+                return
+            probabilities = self.orientation_predictor.predict(image)
+            self.prediction_cache.dump(path, probabilities)
+
+        suggested_orientation = int(np.argmax(probabilities, axis=-1))
+        if metadata is None:
+            orientation, _ = load_exif_data(path)
+            metadata = Metadata(original_orientation=orientation, suggested_orientation=suggested_orientation)
+        else:
+            # The loaded metadata may be shared with the write-behind queue and the GUI thread, so it isn't modified
+            metadata = dataclasses.replace(metadata, suggested_orientation=suggested_orientation)
+        self.metadata_storage_engine.dump(path, metadata)
+
+
+class DirectoryAnalyser(QObject):
+    # The number of images analysed so far, the total number of images in the directory and the fraction of the
+    # predictions that needed all four rotations.
+    progress_changed = Signal(int, int, float)
+
+    def __init__(
+            self,
+            injector: Injector,
+            analysis_config: DirectoryAnalysisConfig,
+            parent: Optional[QObject] = None
+    ):
+        """
+        Analyses all images in the opened directory in the background, so that the suggestions for the images are
+        ready by the time the user gets to them.
+
+        The analysis always gives way to the image that the user is looking at: it pauses while the suggestion for that
+        image is being computed, and for a while after each navigation, so that it doesn't compete with decoding and
+        prefetching while the user is going through the images.
+
+        Parameters
+        ----------
+        injector
+            The injector used to create the analysis runnables.
+        analysis_config
+            The background analysis configuration.
+        parent
+            The parent of the analyser.
+        """
+        super().__init__(parent)
+        self._injector = injector
+        # Created on the first analysis, since injecting it creates the predictor.
+        self._runnable_factory: Optional[Callable[..., DirectoryAnalysisRunnable]] = None
+        self._idle_interval = analysis_config.idle_ms / 1000
+
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._foreground_tasks = 0
+        self._resume_time = 0.0
+        self._current_path: Optional[Path] = None
+
+        thread_pool = QThreadPool(self)
+        thread_pool.setMaxThreadCount(1)
+        self._thread_pool = thread_pool
+        self._analysis_manager = SingleRunnableManager(thread_pool)
+
+    def analyse(self, directory: Path):
+        """
+        Cancels the analysis of the previous directory, if any, and starts analysing the specified one.
+        """
+        self._generation += 1
+        if self._runnable_factory is None:
+            self._runnable_factory = self._injector.inject(DirectoryAnalysisRunnable)
+        runnable = self._runnable_factory(
+            directory=directory,
+            generation=self._generation,
+            wait_for_idle_callback=self._wait_for_idle,
+            is_shown_callback=self._is_shown
+        )
+        runnable.signals.progress_changed.connect(self._progress_changed)
+        with self._condition:
+            self._analysis_manager.start(runnable)
+            self._condition.notify_all()
+
+    def cancel(self):
+        """
+        Cancels the analysis and waits for the image that is being analysed to be finished.
+        """
+        self._generation += 1
+        with self._condition:
+            self._analysis_manager.cancel()
+            self._condition.notify_all()
+        self._thread_pool.waitForDone()
+
+    def user_navigated(self, path: Path):
+        """
+        Pauses the analysis for the idle interval, since the user has navigated to the specified image.
+        """
+        with self._condition:
+            self._current_path = path
+            self._resume_time = time.monotonic() + self._idle_interval
+
+    def foreground_task_started(self):
+        with self._condition:
+            self._foreground_tasks += 1
+
+    def foreground_task_completed(self):
+        with self._condition:
+            self._foreground_tasks -= 1
+            self._condition.notify_all()
+
+    def _wait_for_idle(self, cancellation_token: CancellationToken) -> bool:
+        with self._condition:
+            while not cancellation_token.cancelled:
+                if self._foreground_tasks > 0:
+                    self._condition.wait()
+                    continue
+                remaining = self._resume_time - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            return False
+
+    def _is_shown(self, path: Path) -> bool:
+        with self._condition:
+            return path == self._current_path
+
+    def _progress_changed(self, generation: int, analysed: int, total: int, full_tta_fraction: float):
+        if generation == self._generation:
+            self.progress_changed.emit(analysed, total, full_tta_fraction)
@@ -13,83 +13,344 @@
 #  limitations under the License.
 
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional, Dict, List
 
-from PySide2.QtCore import QThreadPool, QObject
+from PySide2.QtCore import QThreadPool, QObject, Signal, QModelIndex, QRunnable, QTimer, QSize
 from PySide2.QtGui import QImage
+from grundzeug.config import configuration, Configurable
 from grundzeug.container import Injector
 from grundzeug.container.di import Inject
 from typing_extensions import Annotated
 
-from ori3nt8.gui.inference.executors import AbstractExecutor
+from ori3nt8.gui.inference.loading import ModelLoader
 from ori3nt8.gui.inference.runnable import OrientationSuggestionRunnable
+from ori3nt8.gui.runnables.analysis import DirectoryAnalyser, DirectoryAnalysisConfig
 from ori3nt8.gui.runnables.ImageRenderRunnable import ImageReaderRunnable
-from ori3nt8.gui.runnables.MetadataReplacementRunnable import MetadataReplacementRunnable
+from ori3nt8.gui.runnables.ImageScalingRunnable import ImageScalingRunnable
+from ori3nt8.gui.runnables.ThumbnailReadingRunnable import ThumbnailReadingRunnable
+from ori3nt8.gui.runnables.write_behind import OrientationWriteQueue
 from ori3nt8.gui.utils.concurrency import SingleRunnableManager
+from ori3nt8.gui.utils.image_cache import DecodedImageCache, ImageCacheConfig, get_modification_time
+from ori3nt8.gui.utils.qtree import ModelIndexNavigator
+
+
+@configuration(["gui", "prefetch"])
+class PrefetchConfig():
+    images: int = Configurable[int](
+        ["images"],
+        default=2,
+        description="Number of images in the current navigation direction to decode and analyse in advance"
+    )
+
+
+class _PrefetchedImage():
+    def __init__(self, runnable: ImageReaderRunnable, modification_time: Optional[int]):
+        self.runnable = runnable
+        self.modification_time = modification_time
+        # Callbacks of the reads that are waiting for the prefetched image instead of decoding it again.
+        self.waiting_callbacks: List[Callable[[QImage, str], None]] = []
 
 
 class ImageWorkers(QObject):
+    metadata_replacement_backlog_changed = Signal(int)
+    directory_analysis_progress_changed = Signal(int, int, float)
+    model_ready = Signal()
+    model_loading_failed = Signal(str)
+
     def __init__(
             self,
-            executor: Annotated[AbstractExecutor, Inject],
-            injector: Annotated[Injector, Inject]
+            injector: Annotated[Injector, Inject],
+            image_cache_config: Annotated[ImageCacheConfig, Inject],
+            prefetch_config: Annotated[PrefetchConfig, Inject],
+            analysis_config: Annotated[DirectoryAnalysisConfig, Inject]
     ):
         super().__init__()
 
+        self._image_cache = DecodedImageCache(image_cache_config.size_mb * 1024 * 1024)
+        # The modification times of the images that are being decoded, as they were before the decoding started.
+        self._reading_modification_times: Dict[str, Optional[int]] = {}
+        self._reading_path: Optional[str] = None
+
         image_loading_callback = QThreadPool(self)
         image_loading_callback.setMaxThreadCount(1)
         self._image_reading_manager = SingleRunnableManager(image_loading_callback)
 
+        image_scaling_thread_pool = QThreadPool(self)
+        image_scaling_thread_pool.setMaxThreadCount(1)
+        self._image_scaling_manager = SingleRunnableManager(image_scaling_thread_pool)
+
+        # Thumbnails have their own thread, so that reading them never waits for an image to be decoded.
+        thumbnail_reading_thread_pool = QThreadPool(self)
+        thumbnail_reading_thread_pool.setMaxThreadCount(1)
+        self._thumbnail_reading_manager = SingleRunnableManager(thumbnail_reading_thread_pool)
+
+        self._orientation_write_queue = OrientationWriteQueue(self)
+        self._orientation_write_queue.backlog_changed.connect(self.metadata_replacement_backlog_changed)
+        # Writing the orientation only changes the EXIF metadata, so the decoded image remains valid
+        self._orientation_write_queue.write_completed.connect(self._orientation_written)
+
+        self._injector = injector
+        self._model_loader = ModelLoader(injector, self)
+        self._model_loader.ready.connect(self.model_ready)
+        self._model_loader.failed.connect(self.model_loading_failed)
+        # Created once the model has been loaded, since injecting it creates the predictor.
+        self.orientation_suggestion_runnable_factory: Optional[Callable[..., OrientationSuggestionRunnable]] = None
+        self._model_loader.call_when_ready(self._model_loaded)
+        # Incremented by every request, so that only the latest request made while the model was being loaded is
+        # carried out once it has been loaded.
+        self._suggestion_prediction_generation = 0
+        self._directory_analysis_generation = 0
+
         secondary_threadpool = QThreadPool(self)
-        self._image_writing_manager = SingleRunnableManager(secondary_threadpool)
         self._orientation_suggestion_manager = SingleRunnableManager(secondary_threadpool)
-        self.orientation_suggestion_runnable_factory = injector.inject(OrientationSuggestionRunnable)
 
-        self.orientation_nn_executor = executor
+        # Prefetching uses its own thread, so that it never delays the work for the image that is being shown.
+        self._prefetch_thread_pool = QThreadPool(self)
+        self._prefetch_thread_pool.setMaxThreadCount(1)
+        self._prefetch_count = prefetch_config.images
+        self._prefetch_navigator = ModelIndexNavigator.for_visiting_items_in_background(self._prefetch_item)
+        self._prefetch_generation = 0
+        self._prefetch_remaining = 0
+        self._prefetch_reverse = False
+        self._prefetch_runnables: List[QRunnable] = []
+        self._prefetching_images: Dict[str, _PrefetchedImage] = {}
+
+        self._directory_analyser = DirectoryAnalyser(injector, analysis_config, self)
+        self._directory_analyser.progress_changed.connect(self.directory_analysis_progress_changed)
+
+    def load_model(self):
+        """
+        Starts loading the model in the background. Suggestions and analyses requested before it has been loaded are
+        queued until it has.
+        """
+        self._model_loader.load()
+
+    def _model_loaded(self):
+        self.orientation_suggestion_runnable_factory = self._injector.inject(OrientationSuggestionRunnable)
 
     def schedule_image_reading(
             self,
             path: Path,
             processing_completed_callback: Callable[[QImage, str], None]
     ):
-        runnable = ImageReaderRunnable(
-            path=path,
-            remove_runnable_callback=self._image_reading_manager.remove_runnable
-        )
+        self._directory_analyser.user_navigated(path)
+        self._reading_path = str(path)
+        image = self._image_cache.get(path)
+        if image is not None:
+            self._image_reading_manager.cancel()
+            processing_completed_callback(image, str(path))
+            return
+
+        prefetched_image = self._prefetching_images.get(str(path))
+        if prefetched_image is not None:
+            if not self._prefetch_thread_pool.tryTake(prefetched_image.runnable):
+                # The image is already being decoded, wait for it instead of decoding it twice
+                self._image_reading_manager.cancel()
+                prefetched_image.waiting_callbacks.append(processing_completed_callback)
+                return
+            del self._prefetching_images[str(path)]
+
+        self._reading_modification_times[str(path)] = get_modification_time(path)
+        runnable = ImageReaderRunnable(path=path)
+        runnable.signals.processing_completed.connect(self._image_read)
         runnable.signals.processing_completed.connect(processing_completed_callback)
+        runnable.signals.processing_canceled.connect(self._image_reading_canceled)
         self._image_reading_manager.start(runnable)
 
+    def _image_read(self, image: QImage, path: str):
+        if path in self._reading_modification_times:
+            self._image_cache.put(Path(path), self._reading_modification_times.pop(path), image)
+
+    def _image_reading_canceled(self, path: str):
+        # If the image has been requested again, the modification time belongs to the new read
+        if path != self._reading_path:
+            self._reading_modification_times.pop(path, None)
+
+    def schedule_image_scaling(
+            self,
+            image: QImage,
+            size: QSize,
+            key: object,
+            processing_completed_callback: Callable[[QImage, object], None]
+    ):
+        """
+        Scales the image down to fit into the specified size in the background, canceling the previous scaling.
+
+        Parameters
+        ----------
+        image
+            The image to scale.
+        size
+            The size of the box that the image should fit into, in device pixels.
+        key
+            A value identifying the request, which is passed to the callback along with the scaled image.
+        processing_completed_callback
+            Called with the scaled image and the key.
+        """
+        runnable = ImageScalingRunnable(image=image, size=size, key=key)
+        runnable.signals.processing_completed.connect(processing_completed_callback)
+        self._image_scaling_manager.start(runnable)
+
+    def schedule_thumbnail_reading(
+            self,
+            path: Path,
+            processing_completed_callback: Callable[[QImage, int, str], None]
+    ):
+        """
+        Reads the thumbnail embedded into the image's EXIF metadata in the background, canceling the previous read.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+        processing_completed_callback
+            Called with the thumbnail, the EXIF orientation of the image and the path, unless the image doesn't have a
+            thumbnail.
+        """
+        runnable = ThumbnailReadingRunnable(path=path)
+        runnable.signals.processing_completed.connect(processing_completed_callback)
+        self._thumbnail_reading_manager.start(runnable)
+
+    def _orientation_written(self, path: str):
+        self._image_cache.refresh(Path(path))
+
+    def schedule_prefetching(self, index: QModelIndex, reverse: bool):
+        """
+        Decodes and analyses the images that follow the specified item in the navigation direction in the background,
+        so that they can be shown without delay when the user navigates to them.
+
+        Parameters
+        ----------
+        index
+            The index of the item that is being shown.
+        reverse
+            True if the user is navigating backwards.
+        """
+        self._prefetch_navigator.cancel()
+        for runnable in self._prefetch_runnables:
+            self._prefetch_thread_pool.tryTake(runnable)
+        self._prefetch_runnables = []
+        self._prefetching_images = {
+            path: prefetched_image
+            for path, prefetched_image in self._prefetching_images.items()
+            # Images whose decoding has already started will still be cached once they have been decoded
+            if not self._prefetch_thread_pool.tryTake(prefetched_image.runnable)
+        }
+
+        self._prefetch_generation += 1
+        self._prefetch_remaining = self._prefetch_count
+        self._prefetch_reverse = reverse
+        self._navigate_prefetching(index, self._prefetch_generation)
+
+    def _navigate_prefetching(self, index: QModelIndex, generation: int):
+        if generation != self._prefetch_generation or self._prefetch_remaining <= 0:
+            return
+        if self._prefetch_reverse:
+            self._prefetch_navigator.prev_model_index(index)
+        else:
+            self._prefetch_navigator.next_model_index(index)
+
+    def _prefetch_item(self, index: QModelIndex):
+        path = Path(index.model().filePath(index)).absolute()
+        # Closer images are processed first
+        priority = self._prefetch_remaining
+        self._prefetch_image(path, priority)
+
+        # Until the model has been loaded, only the images are prefetched. The directory analysis will catch up on the
+        # suggestions afterwards.
+        if self._model_loader.is_ready:
+            runnable = self.orientation_suggestion_runnable_factory(path=str(path))
+            runnable.setAutoDelete(False)
+            self._prefetch_runnables.append(runnable)
+            self._prefetch_thread_pool.start(runnable, priority)
+
+        self._prefetch_remaining -= 1
+        # The navigator doesn't support starting a new action from the callback of the current one
+        generation = self._prefetch_generation
+        QTimer.singleShot(0, lambda: self._navigate_prefetching(index, generation))
+
+    def _prefetch_image(self, path: Path, priority: int):
+        if str(path) in self._prefetching_images or self._image_cache.get(path) is not None:
+            return
+        runnable = ImageReaderRunnable(path=path)
+        runnable.setAutoDelete(False)
+        runnable.signals.processing_completed.connect(self._prefetched_image_read)
+        self._prefetching_images[str(path)] = _PrefetchedImage(runnable, get_modification_time(path))
+        self._prefetch_thread_pool.start(runnable, priority)
+
+    def _prefetched_image_read(self, image: QImage, path: str):
+        prefetched_image = self._prefetching_images.pop(path, None)
+        if prefetched_image is None:
+            return
+        self._image_cache.put(Path(path), prefetched_image.modification_time, image)
+        for callback in prefetched_image.waiting_callbacks:
+            callback(image, path)
+
+    def schedule_directory_analysis(self, directory: Path):
+        """
+        Analyses all images in the directory in the background, pausing whenever the user is busy.
+        """
+        self._directory_analysis_generation += 1
+        generation = self._directory_analysis_generation
+
+        def analyse():
+            if generation == self._directory_analysis_generation:
+                self._directory_analyser.analyse(directory)
+
+        self._model_loader.call_when_ready(analyse)
+
+    def cancel_directory_analysis(self):
+        self._directory_analysis_generation += 1
+        self._directory_analyser.cancel()
+
     def schedule_metadata_replacement(
             self,
             path: Path,
             orientation: int,
             flip: int
     ):
-        runnable = MetadataReplacementRunnable(
-            path=path,
-            orientation=orientation,
-            flip=flip,
-            remove_runnable_callback=self._image_writing_manager.remove_runnable
-        )
-        self._image_writing_manager.start(runnable)
+        self._orientation_write_queue.schedule(path, orientation, flip)
+
+    def flush_metadata_replacements(self, path: Optional[Path] = None):
+        self._orientation_write_queue.flush(path)
+
+    def wait_for_metadata_replacements(self):
+        self._orientation_write_queue.wait_for_writes()
 
     def schedule_suggestion_prediction(
             self,
             path: Path,
-            orientation: int,
-            image: QImage,
-            result_changed_callback: Callable[[int, int, str], None],
+            result_changed_callback: Callable[[int, str], None],
+            processing_started_callback: Callable[[], None],
+            processing_completed_callback: Callable[[], None]
+    ):
+        self._suggestion_prediction_generation += 1
+        generation = self._suggestion_prediction_generation
+
+        def predict():
+            # Only the suggestion for the image that is shown once the model has been loaded is needed
+            if generation == self._suggestion_prediction_generation:
+                self._start_suggestion_prediction(
+                    path,
+                    result_changed_callback,
+                    processing_started_callback,
+                    processing_completed_callback
+                )
+
+        self._model_loader.call_when_ready(predict)
+
+    def _start_suggestion_prediction(
+            self,
+            path: Path,
+            result_changed_callback: Callable[[int, str], None],
             processing_started_callback: Callable[[], None],
             processing_completed_callback: Callable[[], None]
     ):
-        runnable = self.orientation_suggestion_runnable_factory(
-            path=str(path),
-            original_orientation=orientation,
-            image=image,
-            orientation_nn_executor=self.orientation_nn_executor,
-            remove_runnable_callback=self._orientation_suggestion_manager.remove_runnable
-        )
+        runnable = self.orientation_suggestion_runnable_factory(path=str(path))
         runnable.signals.result_changed.connect(result_changed_callback)
         runnable.signals.processing_started.connect(processing_started_callback)
         runnable.signals.processing_completed.connect(processing_completed_callback)
+        # The suggestion for the image that is being shown takes precedence over the analysis of the directory
+        runnable.signals.processing_started.connect(self._directory_analyser.foreground_task_started)
+        runnable.signals.processing_completed.connect(self._directory_analyser.foreground_task_completed)
         self._orientation_suggestion_manager.start(runnable)
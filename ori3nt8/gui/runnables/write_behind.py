@@ -0,0 +1,141 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PySide2.QtCore import QObject, QThreadPool, QTimer, Signal
+
+from ori3nt8.gui.runnables.MetadataReplacementRunnable import MetadataReplacementRunnable
+
+DEBOUNCE_INTERVAL_MS = 750
+
+
+class OrientationWriteQueue(QObject):
+    backlog_changed = Signal(int)
+    # Emitted with the path to an image once its orientation has been written (or the write has failed).
+    write_completed = Signal(str)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        """
+        Writes orientation changes into the images in the background, coalescing the changes made to each image.
+
+        A change is only written once no further changes have been made for a short while, or once it is flushed
+        explicitly (e.g. when the user navigates to a different image). Rotating an image several times in a row
+        therefore results in a single write of the final orientation. The writes are performed one at a time by a
+        dedicated thread.
+
+        Parameters
+        ----------
+        parent
+            The parent of the queue.
+        """
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        # Changes that may still be superseded by further changes to the same image.
+        self._debouncing: Dict[Path, Tuple[int, int]] = {}
+        # Changes that will be written as soon as the writing thread gets to them.
+        self._ready: Dict[Path, Tuple[int, int]] = {}
+        self._in_flight = 0
+
+        self._thread_pool = QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(1)
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(DEBOUNCE_INTERVAL_MS)
+        self._debounce_timer.timeout.connect(lambda: self.flush())
+
+    @property
+    def backlog(self) -> int:
+        """
+        The number of images whose orientation hasn't been written yet.
+        """
+        with self._lock:
+            return self._backlog()
+
+    def _backlog(self) -> int:
+        return len(self._debouncing) + len(self._ready) + self._in_flight
+
+    def schedule(self, path: Path, orientation: int, flip: int) -> None:
+        """
+        Schedules a change of the orientation of an image, replacing any pending change to the same image.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+        orientation
+            The number of clockwise rotations that have to be applied to correctly orient the image.
+        flip
+            The flip value, which is preserved from the original metadata.
+        """
+        with self._lock:
+            if path in self._ready:
+                # About to be written anyway, so the change doesn't need to be delayed any further
+                self._ready[path] = (orientation, flip)
+            else:
+                self._debouncing[path] = (orientation, flip)
+            backlog = self._backlog()
+        self._debounce_timer.start()
+        self.backlog_changed.emit(backlog)
+
+    def flush(self, path: Optional[Path] = None) -> None:
+        """
+        Writes the pending changes without waiting for the debounce interval to elapse.
+
+        Parameters
+        ----------
+        path
+            If specified, only the pending change to this image is written.
+        """
+        with self._lock:
+            if path is None:
+                self._ready.update(self._debouncing)
+                self._debouncing.clear()
+            elif path in self._debouncing:
+                self._ready[path] = self._debouncing.pop(path)
+            else:
+                return
+            if not self._ready:
+                return
+        self._thread_pool.start(MetadataReplacementRunnable(
+            next_write_callback=self._take_next_write,
+            write_completed_callback=self._write_completed
+        ))
+
+    def wait_for_writes(self) -> None:
+        """
+        Writes all pending changes and blocks until they have been written.
+        """
+        self._debounce_timer.stop()
+        self.flush()
+        self._thread_pool.waitForDone()
+
+    def _take_next_write(self) -> Optional[Tuple[Path, int, int]]:
+        with self._lock:
+            if not self._ready:
+                return None
+            path = next(iter(self._ready))
+            orientation, flip = self._ready.pop(path)
+            self._in_flight += 1
+            return path, orientation, flip
+
+    def _write_completed(self, path: Path) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            backlog = self._backlog()
+        self.write_completed.emit(str(path))
+        self.backlog_changed.emit(backlog)
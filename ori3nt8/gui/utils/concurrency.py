@@ -12,15 +12,61 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import gc
+from abc import abstractmethod
+from typing import Optional, List
 
-from PySide2.QtCore import QObject, QThreadPool, QMutex, QRunnable
+from PySide2.QtCore import QObject, QThreadPool, QRunnable, Slot
+
+
+class CancellationToken():
+    def __init__(self):
+        """
+        A flag that a runnable checks between the stages of its work, so that work whose result is no longer needed
+        can be abandoned even after it has started.
+        """
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+
+class CancellableRunnable(QRunnable):
+    def __init__(self):
+        super().__init__()
+        self.cancellation_token = CancellationToken()
+        self.finished = False
+
+    @Slot()
+    def run(self):
+        try:
+            self.process()
+        finally:
+            self.finished = True
+
+    @abstractmethod
+    def process(self):
+        """
+        Performs the work of the runnable, checking the cancellation token between its stages.
+        """
+        raise NotImplementedError()
 
 
 class SingleRunnableManager(QObject):
     def __init__(self, thread_pool: QThreadPool):
         """
-        Runs a runnable on a thread pool, canceling the previous runnable if it is still enqueued.
+        Runs a runnable on a thread pool, canceling the previous runnable.
+
+        The previous runnable is canceled using its cancellation token rather than by removing it from the thread pool,
+        so it is canceled regardless of whether it has already started. A runnable that hasn't started yet returns
+        immediately once it does, and a running one stops at the next stage boundary and doesn't report its result.
+
+        The runnables aren't deleted by the thread pool. Instead, the manager keeps them until they have finished and
+        releases them when the next runnable is started, so that they (and their signals) are destroyed on the thread
+        that created them rather than on a worker thread.
 
         Parameters
         ----------
@@ -29,31 +75,20 @@ class SingleRunnableManager(QObject):
         """
         super().__init__()
         self._thread_pool = thread_pool
-        self._current_runnable = None
-        self._lock = QMutex()
+        self._current_token: Optional[CancellationToken] = None
+        self._runnables: List[CancellableRunnable] = []
 
-    def remove_runnable(self) -> None:
+    def cancel(self) -> None:
         """
-        Removes the current runnable without canceling its execution.
+        Cancel the current runnable, if any.
         """
-        self._lock.lock()
-        try:
-            del self._current_runnable
-            self._current_runnable = None
-            gc.collect()
-        finally:
-            self._lock.unlock()
-
-    def _cancel(self) -> None:
-        if self._current_runnable is not None:
-            self._thread_pool.cancel(self._current_runnable)
-        del self._current_runnable
-        self._current_runnable = None
-        gc.collect()
+        if self._current_token is not None:
+            self._current_token.cancel()
+            self._current_token = None
 
     def start(
             self,
-            runnable: QRunnable
+            runnable: CancellableRunnable
     ) -> None:
         """
         Cancel the current runnable (if any) and enqueue the runnable for execution on the thread pool.
@@ -64,9 +99,9 @@ class SingleRunnableManager(QObject):
             The runnable to run
 
         """
-        self._lock.lock()
-        try:
-            self._cancel()
-            self._thread_pool.start(runnable)
-        finally:
-            self._lock.unlock()
+        self.cancel()
+        self._runnables = [previous_runnable for previous_runnable in self._runnables if not previous_runnable.finished]
+        self._runnables.append(runnable)
+        self._current_token = runnable.cancellation_token
+        runnable.setAutoDelete(False)
+        self._thread_pool.start(runnable)
@@ -0,0 +1,102 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PySide2.QtGui import QImage
+from grundzeug.config import configuration, Configurable
+
+
+@configuration(["gui", "image_cache"])
+class ImageCacheConfig():
+    size_mb: int = Configurable[int](
+        ["size_mb"],
+        default=512,
+        description="Maximum total size of the pixel buffers of the decoded images kept in memory, in megabytes"
+    )
+
+
+def get_modification_time(path: Path) -> Optional[int]:
+    try:
+        return os.stat(str(path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class DecodedImageCache():
+    def __init__(self, max_bytes: int):
+        """
+        A least recently used cache of decoded images, bounded by the total size of their pixel buffers.
+
+        Images are keyed by their path and modification time, so an image that has been modified since it was decoded
+        is decoded again. The cache isn't thread-safe and should only be used from the GUI thread.
+
+        Parameters
+        ----------
+        max_bytes
+            The maximum total size of the cached images' pixel buffers. Images larger than this are never cached.
+        """
+        self.max_bytes = max_bytes
+        self.size_in_bytes = 0
+        self._images: "OrderedDict[str, Tuple[int, QImage]]" = OrderedDict()
+
+    def get(self, path: Path) -> Optional[QImage]:
+        entry = self._images.get(str(path))
+        if entry is None:
+            return None
+        modification_time, image = entry
+        if modification_time != get_modification_time(path):
+            self._remove(str(path))
+            return None
+        self._images.move_to_end(str(path))
+        return image
+
+    def put(self, path: Path, modification_time: Optional[int], image: QImage) -> None:
+        """
+        Caches the image, evicting the least recently used images if the cache doesn't have enough space.
+
+        Parameters
+        ----------
+        path
+            The path to the image.
+        modification_time
+            The modification time of the file, as it was before the image started being decoded.
+        image
+            The decoded image.
+        """
+        self._remove(str(path))
+        size = image.sizeInBytes()
+        if modification_time is None or image.isNull() or size > self.max_bytes:
+            return
+        self._images[str(path)] = (modification_time, image)
+        self.size_in_bytes += size
+        while self.size_in_bytes > self.max_bytes:
+            self._remove(next(iter(self._images)))
+
+    def refresh(self, path: Path) -> None:
+        """
+        Updates the modification time of a cached image after a change that didn't affect its pixels, such as
+        rewriting its EXIF orientation.
+        """
+        entry = self._images.get(str(path))
+        if entry is not None:
+            self._images[str(path)] = (get_modification_time(path), entry[1])
+
+    def _remove(self, key: str) -> None:
+        entry = self._images.pop(key, None)
+        if entry is not None:
+            self.size_in_bytes -= entry[1].sizeInBytes()
@@ -0,0 +1,96 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import subprocess
+import sys
+from typing import List, Tuple
+
+from grundzeug.config import configuration, Configurable
+
+from ori3nt8.common.containers import build_container
+from ori3nt8.utils.resources import root_path
+
+# The modules imported before the main window is shown.
+STARTUP_MODULES = ["ori3nt8.gui.main", "ori3nt8.gui.MainWindow"]
+
+# Modules that take long to import and are only needed once the model or a non-default storage is used.
+DEFERRED_MODULES = ["caffe2", "onnx", "onnxruntime", "scipy", "sqlalchemy", "PIL", "torch"]
+
+_MEASUREMENT_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+for module in {startup_modules!r}:
+    __import__(module)
+import_time = time.perf_counter() - start_time
+print(json.dumps([import_time, [module for module in {deferred_modules!r} if module in sys.modules]]))
+"""
+
+
+@configuration(["import_time"])
+class ImportTimeConfig():
+    budget_ms: int = Configurable[int](
+        ["budget_ms"],
+        default=1000,
+        description="Maximum time that importing the modules needed to show the main window may take, in milliseconds"
+    )
+    runs: int = Configurable[int](
+        ["runs"],
+        default=5,
+        description="Number of fresh interpreters to measure the import time in, of which the fastest one is used"
+    )
+
+
+def measure_import_time() -> Tuple[float, List[str]]:
+    """
+    Imports the startup modules in a fresh interpreter.
+
+    Returns
+    -------
+    The time taken to import the modules, in seconds, and the deferred modules that were imported along with them.
+    """
+    script = _MEASUREMENT_SCRIPT.format(startup_modules=STARTUP_MODULES, deferred_modules=DEFERRED_MODULES)
+    process = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=str(root_path()),
+        stdout=subprocess.PIPE,
+        check=True
+    )
+    import_time, imported_modules = json.loads(process.stdout.decode().splitlines()[-1])
+    return import_time, imported_modules
+
+
+def main() -> None:
+    container = build_container([ImportTimeConfig])
+    import_time_config: ImportTimeConfig = container.resolve[ImportTimeConfig]()
+
+    measurements = [measure_import_time() for _ in range(import_time_config.runs)]
+    import_time = min(import_time for import_time, _ in measurements)
+    imported_modules = sorted({module for _, modules in measurements for module in modules})
+    print(f"Importing the startup modules took {import_time * 1000:.0f} ms "
+          f"(budget: {import_time_config.budget_ms} ms)")
+
+    failed = False
+    if imported_modules:
+        print(f"The startup modules import modules that should be imported lazily: {', '.join(imported_modules)}")
+        failed = True
+    if import_time * 1000 > import_time_config.budget_ms:
+        print("The import time exceeds the budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
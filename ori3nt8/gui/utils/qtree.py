@@ -138,6 +138,30 @@ class ModelIndexNavigator():
             final_item_callback=lambda x: tree_view.setCurrentIndex(x)
         )
 
+    @classmethod
+    def for_visiting_items_in_background(self, final_item_callback: Callable[[QModelIndex], None]):
+        """
+        Creates a navigator that finds the next or previous leaf without expanding any nodes in the view, e.g. in order
+        to load the items that the user is likely to select next.
+        """
+        return ModelIndexNavigator(
+            # Unexpanded nodes are still loaded by the model, they just aren't shown
+            is_expanded_callback=lambda x: True,
+            expand_callback=lambda x: None,
+            final_item_callback=final_item_callback
+        )
+
+    def cancel(self) -> None:
+        """
+        Abandons the actions that haven't been completed yet.
+        """
+        try:
+            self._queue_lock.acquire()
+            self._operation_queue.clear()
+            self._action_queue.clear()
+        finally:
+            self._queue_lock.release()
+
     def _enqueue_action_and_pump_now(self, action):
         """
         Enqueues the action to be performed once the current action has been performed (i.e. the operation queue has
@@ -0,0 +1,42 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from pathlib import Path
+
+from PySide2.QtGui import QImage
+
+from ori3nt8.utils.jpeg import read_exif_thumbnail
+
+
+def read_exif_thumbnail_image(path: Path) -> QImage:
+    """
+    Decodes the thumbnail embedded into the EXIF metadata of a JPEG image.
+
+    Parameters
+    ----------
+    path
+        The path to the image.
+
+    Returns
+    -------
+    The thumbnail, or a null image if the image doesn't have one or couldn't be read.
+    """
+    try:
+        with open(str(path), "rb") as file:
+            thumbnail = read_exif_thumbnail(file)
+    except OSError:
+        return QImage()
+    if thumbnail is None:
+        return QImage()
+    return QImage.fromData(thumbnail, "JPEG")
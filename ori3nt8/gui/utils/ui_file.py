@@ -17,12 +17,23 @@ import subprocess
 from ori3nt8.utils.resources import root_path
 
 
-def compile_ui_files():
+def compile_ui_files(force: bool = False):
+    """
+    Compiles the Qt Designer files into Python modules using pyside2-uic.
+
+    Parameters
+    ----------
+    force
+        If False, the files whose generated modules are newer than them are skipped.
+    """
     ui_files = (root_path() / "ori3nt8" / "gui" / "ui").glob("**/*.ui")
     for ui_file in ui_files:
+        output_file = ui_file.with_name('Ui_' + ui_file.name).with_suffix('.py')
+        if not force and output_file.exists() and output_file.stat().st_mtime >= ui_file.stat().st_mtime:
+            continue
         cmd = [
             f"pyside2-uic",
-            "-o", str(ui_file.with_name('Ui_' + ui_file.name).with_suffix('.py')),
+            "-o", str(output_file),
             str(ui_file)
         ]
         process = subprocess.run(cmd)
@@ -30,4 +41,4 @@ def compile_ui_files():
 
 
 if __name__ == '__main__':
-    compile_ui_files()
+    compile_ui_files(force=True)
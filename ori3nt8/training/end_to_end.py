@@ -0,0 +1,88 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Tuple
+
+import torch
+from torch.nn import Module
+from torch.nn import functional as F
+
+
+class EndToEndOrientationModel(Module):
+    def __init__(
+            self,
+            model: Module,
+            resize_to: int,
+            crop_to: int,
+            normalization_mean: Tuple[float, float, float],
+            normalization_std: Tuple[float, float, float]
+    ):
+        """
+        Wraps the classifier so that the exported graph performs the same preprocessing and test time augmentation as
+        :py:class:`~ori3nt8.gui.inference.prediction.OrientationPredictor`.
+
+        The graph accepts a batch of uint8 HWC images produced by
+        :py:meth:`~ori3nt8.gui.inference.preprocessing.PreprocessingPipeline.qimage_to_numpy` after resizing, and
+        returns the averaged probabilities of each orientation and the most likely orientation of each image.
+
+        Parameters
+        ----------
+        model
+            The classifier that accepts normalized NCHW tensors.
+        resize_to
+            The height and width of the input images.
+        crop_to
+            The size of the center crop that is passed into the classifier.
+        normalization_mean
+            The image tensor normalization mean.
+        normalization_std
+            The image tensor normalization standard deviation.
+        """
+        super().__init__()
+        self.model = model
+        self.crop_to = crop_to
+        self.crop_offset = int(round((resize_to - crop_to) / 2.))
+        self.register_buffer("normalization_mean", torch.tensor(normalization_mean).reshape((1, 3, 1, 1)))
+        self.register_buffer("normalization_std", torch.tensor(normalization_std).reshape((1, 3, 1, 1)))
+        # torch.flip can't be exported, so the rotations flip the image by gathering the columns in reverse order.
+        self.register_buffer("reversed_columns", torch.arange(crop_to - 1, -1, -1))
+
+    def rotate(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Rotates the NCHW tensor the same way as `np.rot90(x, axes=(2, 3))`.
+        """
+        return x.index_select(3, self.reversed_columns).transpose(2, 3)
+
+    def forward(self, images: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        crop_start = self.crop_offset
+        crop_end = self.crop_offset + self.crop_to
+        x = images.permute(0, 3, 1, 2)
+        x = x[:, :, crop_start: crop_end, crop_start: crop_end]
+        x = x.float() / 255
+        x = (x - self.normalization_mean) / self.normalization_std
+
+        rotations = [x]
+        for _ in range(3):
+            rotations.append(self.rotate(rotations[-1]))
+        logits = self.model(torch.cat(rotations, dim=0))
+
+        probabilities = F.softmax(logits, dim=-1)
+        probabilities = probabilities.reshape((4, -1, probabilities.shape[-1]))
+        # Shift the probabilities of the n-th rotation by n so that they refer to the orientation of the original image
+        aligned = [probabilities[0]] + [
+            torch.cat([probabilities[i, :, i:], probabilities[i, :, :i]], dim=-1)
+            for i in range(1, 4)
+        ]
+        probabilities = torch.stack(aligned, dim=0).mean(dim=0)
+        return probabilities, probabilities.argmax(dim=-1)
@@ -14,9 +14,12 @@
 
 from io import BytesIO
 from pathlib import Path
+from typing import Sequence
 
 import geffnet
+import numpy as np
 import onnx
+import onnxruntime
 import torch
 from grundzeug.config import configuration, Configurable
 from grundzeug.config.providers.common import ConfigurationProvider, DictTreeConfigurationProvider
@@ -24,13 +27,39 @@ from grundzeug.container.plugins import BeanList
 from onnx import optimizer
 
 from ori3nt8.training.common import DatasetConfig, TrainingConfig
-from ori3nt8.training.containers import build_container
+from ori3nt8.common.containers import build_container
+from ori3nt8.training.end_to_end import EndToEndOrientationModel
 from ori3nt8.training.model import Ori3nt8LightningModel
 from ori3nt8.training.models import EfficientNetConfig, EfficientNetModelFactory, AbstractModelFactory
 from ori3nt8.training.optimizers import AdamConfig, AdamOptimizerFactory, AbstractOptimizerFactory
 from ori3nt8.training.preprocessing import DefaultPreprocessingFactory, \
     AbstractPreprocessingFactory
+from ori3nt8.training.quantization import QuantizationConfig, quantize_model, QUANTIZATION_NONE
 from ori3nt8.common.preprocessing import PreprocessingConfig
+from ori3nt8.gui.inference.executors import OnnxRuntimeSessionExecutor
+from ori3nt8.gui.inference.prediction import OrientationPredictor
+from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
+
+# Set of optimization passes used in gen-efficientnet-pytorch:
+# https://github.com/rwightman/gen-efficientnet-pytorch/blob/master/onnx_optimize.py#L37
+ONNX_OPTIMIZATION_PASSES = [
+    "eliminate_identity",
+    "eliminate_nop_dropout",
+    "eliminate_nop_pad",
+    "eliminate_nop_transpose",
+    "eliminate_unused_initializer",
+    "extract_constant_to_initializer",
+    "fuse_add_bias_into_conv",
+    "fuse_bn_into_conv",
+    "fuse_consecutive_concats",
+    "fuse_consecutive_reduce_unsqueeze",
+    "fuse_consecutive_squeezes",
+    "fuse_consecutive_transposes",
+    "fuse_pad_into_conv"
+]
+
+# Batch sizes that the exported graph must support: a single tensor, the rotations of one image and a full batch.
+DYNAMIC_BATCH_CHECK_SIZES = (1, 4, 64)
 
 
 @configuration(["export"])
@@ -46,11 +75,105 @@ class ExportConfig:
         description="The path to the input checkpoint"
     )
 
+    end_to_end: bool = Configurable[bool](
+        ["end_to_end"],
+        default=False,
+        description="Set to true to additionally export a graph that includes the preprocessing and test time "
+                    "augmentation"
+    )
+
+    end_to_end_output_path: Path = Configurable[Path](
+        ["end_to_end_output_path"],
+        default=Path("resources") / "network_end_to_end.onnx",
+        description="The path to the output end-to-end onnx file"
+    )
+
+
+def check_dynamic_batch_size(model_path: Path, crop_to: int, batch_sizes: Sequence[int]) -> None:
+    """
+    Runs the exported graph with each batch size and checks that every sample's output does not depend on the batch
+    it was passed in.
+    """
+    executor = OnnxRuntimeSessionExecutor(onnxruntime.InferenceSession(str(model_path)))
+    x = np.random.normal(0, 1, size=(max(batch_sizes), 3, crop_to, crop_to)).astype(np.float32)
+    reference = executor(x)
+    for batch_size in batch_sizes:
+        output = executor(x[:batch_size])
+        if output.shape != (batch_size,) + reference.shape[1:]:
+            raise ValueError(
+                f"The exported graph produced an output of shape {output.shape} for batch size {batch_size}"
+            )
+        if not np.allclose(output, reference[:batch_size], rtol=1e-3, atol=1e-4):
+            raise ValueError(f"The exported graph produced different results for batch size {batch_size}")
+    print(f"The exported graph supports batch sizes {', '.join(str(batch_size) for batch_size in batch_sizes)}")
+
+
+def export_end_to_end(model, preprocessing_config: PreprocessingConfig, output_path: Path) -> None:
+    """
+    Exports a graph that accepts resized uint8 HWC images and returns the averaged orientation probabilities and the
+    most likely orientation of each image.
+    """
+    end_to_end_model = EndToEndOrientationModel(
+        model,
+        resize_to=preprocessing_config.resize_to,
+        crop_to=preprocessing_config.crop_to,
+        normalization_mean=preprocessing_config.normalization_mean,
+        normalization_std=preprocessing_config.normalization_std
+    )
+    resize_to = preprocessing_config.resize_to
+    images = torch.randint(0, 256, size=(1, resize_to, resize_to, 3), dtype=torch.uint8)
+    outputs = end_to_end_model(images)
+    traced = torch.jit.trace(end_to_end_model, images)
+
+    buf = BytesIO()
+    torch.onnx.export(
+        traced,
+        images,
+        buf,
+        input_names=["images"],
+        output_names=["probabilities", "orientation"],
+        dynamic_axes={
+            "images": {0: "batch"},
+            "probabilities": {0: "batch"},
+            "orientation": {0: "batch"}
+        },
+        example_outputs=outputs,
+        operator_export_type=torch.onnx.OperatorExportTypes.ONNX_ATEN_FALLBACK,
+        opset_version=12,
+        do_constant_folding=True
+    )
+    buf.seek(0)
+    optimized_model = optimizer.optimize(onnx.load(buf), ONNX_OPTIMIZATION_PASSES)
+    onnx.save(optimized_model, str(output_path))
+
+
+def check_end_to_end_graph(
+        model_path: Path,
+        end_to_end_model_path: Path,
+        preprocessing_pipeline: PreprocessingPipeline
+) -> None:
+    """
+    Checks that the end-to-end graph produces the same probabilities as the NumPy preprocessing and test time
+    augmentation around the plain graph.
+    """
+    predictor = OrientationPredictor(
+        executor=OnnxRuntimeSessionExecutor(onnxruntime.InferenceSession(str(model_path))),
+        preprocessing_pipeline=preprocessing_pipeline
+    )
+    end_to_end_executor = OnnxRuntimeSessionExecutor(onnxruntime.InferenceSession(str(end_to_end_model_path)))
+    resize_to = preprocessing_pipeline.resize_to
+    images = np.random.randint(0, 256, size=(2, resize_to, resize_to, 3), dtype=np.uint8)
+    for image, probabilities in zip(images, end_to_end_executor(images)):
+        expected = predictor.infer(predictor.create_batch_array(preprocessing_pipeline.preprocess(image)))
+        if not np.allclose(probabilities, expected, atol=1e-4):
+            raise ValueError("The end-to-end graph doesn't match the NumPy preprocessing and test time augmentation")
+    print("The end-to-end graph matches the NumPy preprocessing and test time augmentation")
+
 
 def main() -> None:
     container = build_container(
         [DatasetConfig, ExportConfig, DatasetConfig, TrainingConfig, EfficientNetConfig, AdamConfig,
-         PreprocessingConfig]
+         PreprocessingConfig, QuantizationConfig]
     )
     container.register_type[AbstractOptimizerFactory, AdamOptimizerFactory]()
     container.register_type[AbstractModelFactory, EfficientNetModelFactory]()
@@ -85,6 +208,7 @@ def main() -> None:
     x = torch.normal(0, 1, size=(4, 3, crop_to, crop_to)).to(dtype=torch.float)
     outputs = model(x)
     input_names = ["x"]
+    output_names = ["y"]
     outputs = model(x)
 
     traced = torch.jit.trace(model, x)
@@ -100,6 +224,11 @@ def main() -> None:
         x,
         buf,
         input_names=input_names,
+        output_names=output_names,
+        dynamic_axes={
+            "x": {0: "batch"},
+            "y": {0: "batch"}
+        },
         example_outputs=outputs,
         operator_export_type=torch.onnx.OperatorExportTypes.ONNX_ATEN_FALLBACK,
         opset_version=12,
@@ -108,26 +237,25 @@ def main() -> None:
     buf.seek(0)
     onnx_model = onnx.load(buf)
 
-    # Set of optimization passes used in gen-efficientnet-pytorch:
-    # https://github.com/rwightman/gen-efficientnet-pytorch/blob/master/onnx_optimize.py#L37
-    passes = [
-        "eliminate_identity",
-        "eliminate_nop_dropout",
-        "eliminate_nop_pad",
-        "eliminate_nop_transpose",
-        "eliminate_unused_initializer",
-        "extract_constant_to_initializer",
-        "fuse_add_bias_into_conv",
-        "fuse_bn_into_conv",
-        "fuse_consecutive_concats",
-        "fuse_consecutive_reduce_unsqueeze",
-        "fuse_consecutive_squeezes",
-        "fuse_consecutive_transposes",
-        "fuse_pad_into_conv"
-    ]
-
-    optimized_model = optimizer.optimize(onnx_model, passes)
+    optimized_model = optimizer.optimize(onnx_model, ONNX_OPTIMIZATION_PASSES)
     onnx.save(optimized_model, str(export_config.output_path))
+    check_dynamic_batch_size(export_config.output_path, crop_to, DYNAMIC_BATCH_CHECK_SIZES)
+
+    if export_config.end_to_end:
+        export_end_to_end(model, container.resolve[PreprocessingConfig](), export_config.end_to_end_output_path)
+        check_end_to_end_graph(
+            export_config.output_path,
+            export_config.end_to_end_output_path,
+            container.inject(PreprocessingPipeline)()
+        )
+
+    quantization_config: QuantizationConfig = container.resolve[QuantizationConfig]()
+    if quantization_config.mode != QUANTIZATION_NONE:
+        quantize_model(
+            export_config.output_path,
+            quantization_config,
+            container.inject(PreprocessingPipeline)()
+        )
 
 
 if __name__ == '__main__':
@@ -24,7 +24,7 @@ from pytorch_lightning import Trainer
 from pytorch_lightning.callbacks import ModelCheckpoint
 
 from ori3nt8.training.common import DatasetConfig, TrainingConfig
-from ori3nt8.training.containers import build_container
+from ori3nt8.common.containers import build_container
 from ori3nt8.training.model import Ori3nt8LightningModel
 from ori3nt8.training.models import AbstractModelFactory, EfficientNetModelFactory, EfficientNetConfig
 from ori3nt8.training.optimizers import AbstractOptimizerFactory, AdamOptimizerFactory, AdamConfig
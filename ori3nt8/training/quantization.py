@@ -0,0 +1,168 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import itertools
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+import onnxruntime
+from grundzeug.config import configuration, Configurable
+from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+
+from ori3nt8.gui.inference.executors import OnnxRuntimeSessionExecutor
+from ori3nt8.gui.inference.prediction import OrientationPredictor
+from ori3nt8.gui.inference.preprocessing import PreprocessingPipeline
+from ori3nt8.utils.jpeg import iter_jpeg_files
+
+QUANTIZATION_NONE = "none"
+QUANTIZATION_DYNAMIC = "dynamic"
+QUANTIZATION_STATIC = "static"
+
+
+@configuration(["export", "quantization"])
+class QuantizationConfig:
+    mode: str = Configurable[str](
+        ["mode"],
+        default=QUANTIZATION_NONE,
+        description=f"Set to \"{QUANTIZATION_DYNAMIC}\" or \"{QUANTIZATION_STATIC}\" to additionally export an INT8 "
+                    f"model, or to \"{QUANTIZATION_NONE}\" to only export the FP32 model"
+    )
+    output_path: Path = Configurable[Path](
+        ["output_path"],
+        default=Path("resources") / "network_int8.onnx",
+        description="The path to the output quantized onnx file"
+    )
+    calibration_path: Path = Configurable[Path](
+        ["calibration_path"],
+        default=Path("calibration"),
+        description="Path to a directory of correctly oriented images used for calibration and evaluation"
+    )
+    calibration_images: int = Configurable[int](
+        ["calibration_images"],
+        default=128,
+        description="Number of images used to calibrate the activation ranges during static quantization"
+    )
+    evaluation_images: int = Configurable[int](
+        ["evaluation_images"],
+        default=512,
+        description="Number of images (following the calibration images) used to compare the accuracy of the models"
+    )
+
+
+class BatchCalibrationDataReader(CalibrationDataReader):
+    def __init__(self, batches: Iterator[np.ndarray], input_name: str):
+        self.batches = batches
+        self.input_name = input_name
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        if batch is None:
+            return None
+        return {self.input_name: batch}
+
+
+def iter_rotated_batches(
+        predictor: OrientationPredictor,
+        path: Path,
+        skip: int,
+        limit: int
+) -> Iterator[np.ndarray]:
+    """
+    Yields the network inputs (all four rotations) of `limit` images from the directory, after skipping `skip` images.
+    """
+    for image_path in itertools.islice(iter_jpeg_files(path), skip, skip + limit):
+        image = predictor.preprocessing_pipeline.read_image(image_path)
+        if image.isNull():
+            continue
+        yield predictor.prepare(image)
+
+
+def evaluate_accuracy(predictor: OrientationPredictor, batches: Iterator[np.ndarray]) -> Tuple[float, float]:
+    """
+    Measures the accuracy of the predictor on correctly oriented images.
+
+    Returns
+    -------
+    The accuracy of a single pass over each rotation, and the accuracy after averaging the four rotations.
+    """
+    single_pass_correct = 0
+    averaged_correct = 0
+    image_count = 0
+    for batch in batches:
+        logits = predictor.executor(batch)
+        # The n-th element of the batch is the original image rotated n times, so it should be classified as n.
+        single_pass_correct += int(np.sum(np.argmax(logits, axis=-1) == np.arange(len(batch))))
+        averaged_correct += int(np.argmax(predictor.postprocess(logits), axis=-1) == 0)
+        image_count += 1
+    if image_count == 0:
+        raise ValueError("No images are available for evaluation")
+    return single_pass_correct / (image_count * 4), averaged_correct / image_count
+
+
+def quantize_model(
+        model_path: Path,
+        quantization_config: QuantizationConfig,
+        preprocessing_pipeline: PreprocessingPipeline
+) -> None:
+    """
+    Writes an INT8 version of the FP32 model and reports the difference between the accuracies of the two models.
+
+    Parameters
+    ----------
+    model_path
+        The path to the FP32 onnx model.
+    quantization_config
+        The quantization settings.
+    preprocessing_pipeline
+        The pipeline that is used to convert the calibration and evaluation images into input tensors.
+    """
+    fp32_predictor = OrientationPredictor(
+        executor=OnnxRuntimeSessionExecutor(onnxruntime.InferenceSession(str(model_path))),
+        preprocessing_pipeline=preprocessing_pipeline
+    )
+    calibration_path = quantization_config.calibration_path
+
+    if quantization_config.mode == QUANTIZATION_DYNAMIC:
+        quantize_dynamic(str(model_path), str(quantization_config.output_path), weight_type=QuantType.QUInt8)
+    elif quantization_config.mode == QUANTIZATION_STATIC:
+        calibration_data_reader = BatchCalibrationDataReader(
+            iter_rotated_batches(fp32_predictor, calibration_path, 0, quantization_config.calibration_images),
+            input_name=fp32_predictor.executor.input_name
+        )
+        quantize_static(str(model_path), str(quantization_config.output_path), calibration_data_reader)
+    else:
+        raise ValueError(f"Unknown quantization mode: {quantization_config.mode}")
+
+    int8_predictor = OrientationPredictor(
+        executor=OnnxRuntimeSessionExecutor(onnxruntime.InferenceSession(str(quantization_config.output_path))),
+        preprocessing_pipeline=preprocessing_pipeline
+    )
+    accuracies = {}
+    for name, predictor in [("FP32", fp32_predictor), ("INT8", int8_predictor)]:
+        accuracies[name] = evaluate_accuracy(
+            predictor,
+            iter_rotated_batches(
+                predictor,
+                calibration_path,
+                quantization_config.calibration_images,
+                quantization_config.evaluation_images
+            )
+        )
+        single_pass_accuracy, averaged_accuracy = accuracies[name]
+        print(f"{name} accuracy: {single_pass_accuracy:.4f} (single pass), {averaged_accuracy:.4f} (averaged)")
+    print(
+        f"Accuracy delta: {accuracies['INT8'][0] - accuracies['FP32'][0]:+.4f} (single pass), "
+        f"{accuracies['INT8'][1] - accuracies['FP32'][1]:+.4f} (averaged)"
+    )
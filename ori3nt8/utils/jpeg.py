@@ -0,0 +1,296 @@
+#  Copyright 2020 Nick Guletskii
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional, List
+
+MARKER_SOI = 0xD8
+MARKER_SOS = 0xDA
+MARKER_APP1 = 0xE1
+JPEG_SIGNATURE = bytes([0xFF, MARKER_SOI])
+
+EXIF_HEADER = b"Exif\x00\x00"
+TIFF_TAG_ORIENTATION = 0x0112
+TIFF_TAG_JPEG_INTERCHANGE_FORMAT = 0x0201
+TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+TIFF_TYPE_SHORT = 3
+TIFF_TYPE_LONG = 4
+_TIFF_HEADER_SIZE = 8
+_TIFF_IFD_ENTRY_SIZE = 12
+
+# Markers that aren't followed by a length field.
+_STANDALONE_MARKERS = {0x01, MARKER_SOI, *range(0xD0, 0xD8)}
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+JPEG_SUFFIXES = (".jpg", ".jpeg")
+
+
+class JpegSegment(NamedTuple):
+    marker: int
+    # The offset of the segment's payload (which follows the marker and the length field) in the file.
+    offset: int
+    # The length of the payload, excluding the length field itself.
+    length: int
+
+
+def iter_jpeg_files(root: Path) -> Iterator[Path]:
+    """
+    Lazily walks the directory tree, yielding JPEG files in a deterministic order.
+    """
+    for dir_path, dir_names, file_names in os.walk(str(root)):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(JPEG_SUFFIXES):
+                yield Path(dir_path) / file_name
+
+
+def iter_segments(file: BinaryIO) -> Iterator[JpegSegment]:
+    """
+    Walks the marker segments of a JPEG file, without reading their payloads.
+
+    The walk stops after the start of scan segment, since the entropy-coded image data follows it. Nothing is yielded
+    if the file isn't a JPEG file.
+
+    Parameters
+    ----------
+    file
+        A seekable binary file positioned at the start of the image.
+    """
+    if file.read(len(JPEG_SIGNATURE)) != JPEG_SIGNATURE:
+        return
+    while True:
+        prefix = file.read(1)
+        if prefix != b"\xff":
+            return
+        marker = file.read(1)
+        while marker == b"\xff":
+            # Markers may be preceded by any number of fill bytes
+            marker = file.read(1)
+        if not marker:
+            return
+        marker = marker[0]
+        if marker in _STANDALONE_MARKERS:
+            continue
+        length_bytes = file.read(2)
+        if len(length_bytes) != 2:
+            return
+        length = int.from_bytes(length_bytes, "big") - 2
+        if length < 0:
+            return
+        offset = file.tell()
+        yield JpegSegment(marker=marker, offset=offset, length=length)
+        if marker == MARKER_SOS:
+            return
+        file.seek(offset + length)
+
+
+class ExifOrientationField(NamedTuple):
+    # The offset of the tag's two byte value in the file.
+    offset: int
+    # The byte order of the TIFF structure, either "little" or "big".
+    byte_order: str
+    value: int
+
+
+def find_exif_orientation(file: BinaryIO) -> Optional[ExifOrientationField]:
+    """
+    Locates the Orientation tag in the IFD0 of a JPEG file's EXIF metadata.
+
+    Only the marker segment headers, the TIFF header and the IFD0 entries are read, which usually amounts to a few
+    kilobytes regardless of the size of the file.
+
+    Parameters
+    ----------
+    file
+        A seekable binary file positioned at the start of the image.
+
+    Returns
+    -------
+    The location and value of the tag, or None if the file doesn't contain an Orientation tag.
+    """
+    tiff = _find_tiff_structure(file)
+    if tiff is None:
+        return None
+    ifd = _read_ifd(file, tiff, tiff.ifd0_offset)
+    if ifd is None:
+        return None
+
+    for i, entry in enumerate(ifd.entries):
+        if int.from_bytes(entry[0:2], tiff.byte_order) != TIFF_TAG_ORIENTATION:
+            continue
+        value_type = int.from_bytes(entry[2:4], tiff.byte_order)
+        value_count = int.from_bytes(entry[4:8], tiff.byte_order)
+        if value_type != TIFF_TYPE_SHORT or value_count != 1:
+            return None
+        # Values that fit into four bytes are stored in the entry itself, left-justified
+        return ExifOrientationField(
+            offset=ifd.entries_offset + i * _TIFF_IFD_ENTRY_SIZE + 8,
+            byte_order=tiff.byte_order,
+            value=int.from_bytes(entry[8:10], tiff.byte_order)
+        )
+    return None
+
+
+def read_exif_thumbnail(file: BinaryIO) -> Optional[bytes]:
+    """
+    Reads the JPEG thumbnail stored in the IFD1 of a JPEG file's EXIF metadata.
+
+    Most cameras embed a small (usually 160x120) thumbnail into every photo. Like :py:func:`find_exif_orientation`,
+    this only reads the headers of the file and the thumbnail itself.
+
+    Parameters
+    ----------
+    file
+        A seekable binary file positioned at the start of the image.
+
+    Returns
+    -------
+    The JPEG-encoded thumbnail, or None if the file doesn't contain one.
+    """
+    tiff = _find_tiff_structure(file)
+    if tiff is None:
+        return None
+    ifd0 = _read_ifd(file, tiff, tiff.ifd0_offset)
+    if ifd0 is None or ifd0.next_ifd_offset == 0:
+        return None
+    ifd1 = _read_ifd(file, tiff, tiff.tiff_offset + ifd0.next_ifd_offset)
+    if ifd1 is None:
+        return None
+
+    thumbnail_offset = None
+    thumbnail_length = None
+    for entry in ifd1.entries:
+        tag = int.from_bytes(entry[0:2], tiff.byte_order)
+        value_type = int.from_bytes(entry[2:4], tiff.byte_order)
+        if value_type == TIFF_TYPE_LONG:
+            value = int.from_bytes(entry[8:12], tiff.byte_order)
+        elif value_type == TIFF_TYPE_SHORT:
+            value = int.from_bytes(entry[8:10], tiff.byte_order)
+        else:
+            continue
+        if tag == TIFF_TAG_JPEG_INTERCHANGE_FORMAT:
+            thumbnail_offset = tiff.tiff_offset + value
+        elif tag == TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH:
+            thumbnail_length = value
+    if thumbnail_offset is None or not thumbnail_length or thumbnail_offset + thumbnail_length > tiff.end:
+        return None
+
+    file.seek(thumbnail_offset)
+    thumbnail = file.read(thumbnail_length)
+    if not thumbnail.startswith(JPEG_SIGNATURE):
+        return None
+    return thumbnail
+
+
+class _TiffStructure(NamedTuple):
+    byte_order: str
+    # The offset of the TIFF header in the file. Offsets within the TIFF structure are relative to it.
+    tiff_offset: int
+    # The offset of the IFD0 in the file.
+    ifd0_offset: int
+    # The offset of the end of the EXIF segment in the file.
+    end: int
+
+
+class _Ifd(NamedTuple):
+    # The offset of the first entry in the file.
+    entries_offset: int
+    entries: List[bytes]
+    # The offset of the next IFD, relative to the TIFF header, or 0 if this is the last IFD.
+    next_ifd_offset: int
+
+
+def _find_tiff_structure(file: BinaryIO) -> Optional[_TiffStructure]:
+    for segment in iter_segments(file):
+        if segment.marker != MARKER_APP1 or segment.length < len(EXIF_HEADER) + _TIFF_HEADER_SIZE:
+            continue
+        file.seek(segment.offset)
+        if file.read(len(EXIF_HEADER)) != EXIF_HEADER:
+            # Probably XMP metadata, which is also stored in an APP1 segment
+            continue
+        tiff_offset = segment.offset + len(EXIF_HEADER)
+        header = file.read(_TIFF_HEADER_SIZE)
+        if header[:2] == b"II":
+            byte_order = "little"
+        elif header[:2] == b"MM":
+            byte_order = "big"
+        else:
+            return None
+        if int.from_bytes(header[2:4], byte_order) != 42:
+            return None
+        return _TiffStructure(
+            byte_order=byte_order,
+            tiff_offset=tiff_offset,
+            ifd0_offset=tiff_offset + int.from_bytes(header[4:8], byte_order),
+            end=segment.offset + segment.length
+        )
+    return None
+
+
+def _read_ifd(file: BinaryIO, tiff: _TiffStructure, ifd_offset: int) -> Optional[_Ifd]:
+    if ifd_offset + 2 > tiff.end:
+        return None
+    file.seek(ifd_offset)
+    entry_count = int.from_bytes(file.read(2), tiff.byte_order)
+    entries_offset = ifd_offset + 2
+    next_ifd_pointer_offset = entries_offset + entry_count * _TIFF_IFD_ENTRY_SIZE
+    if next_ifd_pointer_offset > tiff.end:
+        return None
+    entries = file.read(entry_count * _TIFF_IFD_ENTRY_SIZE)
+    next_ifd_offset = 0
+    if next_ifd_pointer_offset + 4 <= tiff.end:
+        next_ifd_offset = int.from_bytes(file.read(4), tiff.byte_order)
+    return _Ifd(
+        entries_offset=entries_offset,
+        entries=[entries[i * _TIFF_IFD_ENTRY_SIZE: (i + 1) * _TIFF_IFD_ENTRY_SIZE] for i in range(entry_count)],
+        next_ifd_offset=next_ifd_offset
+    )
+
+
+def hash_image_content(path: Path) -> str:
+    """
+    Hashes a JPEG file, skipping the APP1 segments that hold its EXIF and XMP metadata.
+
+    Changing the orientation of an image rewrites its EXIF metadata, but leaves the hash unchanged. Files that aren't
+    JPEG files are hashed in their entirety.
+
+    Parameters
+    ----------
+    path
+        The path to the image.
+
+    Returns
+    -------
+    The hexadecimal SHA-256 digest.
+    """
+    hasher = hashlib.sha256()
+    with open(str(path), "rb") as file:
+        segments = list(iter_segments(file))
+        if not segments or segments[-1].marker != MARKER_SOS:
+            data_offset = 0
+        else:
+            for segment in segments:
+                if segment.marker == MARKER_APP1:
+                    continue
+                file.seek(segment.offset)
+                hasher.update(bytes([0xFF, segment.marker]))
+                hasher.update(file.read(segment.length))
+            data_offset = segments[-1].offset + segments[-1].length
+        file.seek(data_offset)
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
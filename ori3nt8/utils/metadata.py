@@ -12,19 +12,25 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import os
 from io import BytesIO
 from pathlib import Path
-from typing import Tuple
+from typing import Tuple, Optional
 
 import piexif
 from PySide2.QtCore import QSaveFile, QFile, QByteArray, QIODevice
 
+from ori3nt8.utils.jpeg import find_exif_orientation, JPEG_SIGNATURE
+
 ROT_TO_EXIF = {
     (0, 0): 1, (3, 0): 8, (2, 0): 3, (1, 0): 6,
     (0, 1): 2, (3, 1): 7, (2, 1): 4, (1, 1): 5,
 }
 EXIF_TO_ROT = {v: k for k, v in ROT_TO_EXIF.items()}
 
+# Writes that don't cross a sector boundary can't be torn by a crash.
+_SECTOR_SIZE = 512
+
 
 def load_exif_data(path: Path) -> Tuple[int, bool]:
     """
@@ -41,21 +47,28 @@ def load_exif_data(path: Path) -> Tuple[int, bool]:
     the image. The second value contains 0 if the image is not flipped, and 1 if the image is flipped horizontally.
 
     """
-    file = QFile(str(path))
-    file.open(QIODevice.ReadOnly)
-    if not file.isOpen():
-        raise Exception(f"Couldn't open {path} for writing!")
-    data = file.readAll()
-    exif_dict = piexif.load(data.data())
+    with open(str(path), "rb") as file:
+        is_jpeg = file.read(len(JPEG_SIGNATURE)) == JPEG_SIGNATURE
+        file.seek(0)
+        if is_jpeg:
+            # Only the headers preceding the image data are read
+            field = find_exif_orientation(file)
+            orient = field.value if field is not None else None
+        else:
+            orient = _load_exif_orientation_using_piexif(file.read())
+    if orient is None:
+        return 0, 0
+    if orient not in EXIF_TO_ROT:
+        # Fall back to default (correct) orientation
+        orient = 1
+    return EXIF_TO_ROT[orient]
+
+
+def _load_exif_orientation_using_piexif(data: bytes) -> Optional[int]:
+    exif_dict = piexif.load(data)
     if "0th" in exif_dict and piexif.ImageIFD.Orientation in exif_dict["0th"]:
-        orient = exif_dict["0th"][piexif.ImageIFD.Orientation]
-        if orient not in EXIF_TO_ROT:
-            # Fall back to default (correct) orientation
-            orient = 1
-        orientation, flip = EXIF_TO_ROT[orient]
-    else:
-        orientation, flip = 0, 0
-    return orientation, flip
+        return exif_dict["0th"][piexif.ImageIFD.Orientation]
+    return None
 
 
 def replace_exif_orientation(path: Path, orientation: int, flip: int) -> None:
@@ -72,9 +85,12 @@ def replace_exif_orientation(path: Path, orientation: int, flip: int) -> None:
         EXIF orientation supports horizontally flipped images. Ori3nt8 simply preserves the flip value from the original
         metadata.
     """
+    orient = ROT_TO_EXIF[(orientation, flip)]
+    if _patch_exif_orientation(path, orient):
+        return
+
     data_str = _read_jpeg_bytes(path)
     exif_dict = piexif.load(data_str)
-    orient = ROT_TO_EXIF[(orientation, flip)]
     exif_dict["0th"][piexif.ImageIFD.Orientation] = orient
     exif_bytes = piexif.dump(exif_dict)
     new_file_bytes_io = BytesIO()
@@ -82,6 +98,30 @@ def replace_exif_orientation(path: Path, orientation: int, flip: int) -> None:
     _write_jpeg_bytes(new_file_bytes_io, path)
 
 
+def _patch_exif_orientation(path: Path, orient: int) -> bool:
+    """
+    Overwrites the two bytes holding the value of an existing Orientation tag, leaving the rest of the file untouched.
+
+    Returns
+    -------
+    False if the file has to be rewritten instead, either because it doesn't contain an Orientation tag or because the
+    value straddles a sector boundary and therefore can't be written atomically.
+    """
+    with open(str(path), "r+b") as file:
+        field = find_exif_orientation(file)
+        if field is None:
+            return False
+        if field.value == orient:
+            return True
+        if field.offset // _SECTOR_SIZE != (field.offset + 1) // _SECTOR_SIZE:
+            return False
+        file.seek(field.offset)
+        file.write(orient.to_bytes(2, field.byte_order))
+        file.flush()
+        os.fsync(file.fileno())
+    return True
+
+
 def _read_jpeg_bytes(path):
     file = QFile(str(path))
     file.open(QIODevice.ReadOnly)